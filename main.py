@@ -22,18 +22,193 @@ Code Interpreter            +------------------+
 
 import re
 import os
-import requests
+import queue
+import atexit
+import asyncio
+import logging
+import time
+import hashlib
+import threading
+import functools
+import importlib.util
+import http.cookiejar
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from logging.handlers import QueueHandler, QueueListener
+from urllib.parse import urlsplit, urlunsplit
+import diskcache
+import httpx
 from markdownify import markdownify
-from requests.exceptions import RequestException
 from huggingface_hub import login
 from dotenv import load_dotenv
+try:
+    import trafilatura
+except ImportError:  # Optional: fall back to markdownify for every page
+    trafilatura = None
 from smolagents import (
     CodeAgent,
     ToolCallingAgent,
     HfApiModel,
-    DuckDuckGoSearchTool,
+    LiteLLMModel,
+    Tool,
     tool
 )
+from smolagents.memory import ActionStep
+from smolagents.utils import AgentMaxStepsError
+from tools.cached_search import CachedDuckDuckGoSearchTool
+from tools.model_warmup import warm_up_model
+
+logger = logging.getLogger("dharmagents")
+
+def setup_logging():
+    """Route status messages through a queue so emitting them never blocks on the console."""
+    log_queue = queue.Queue(-1)
+    listener = QueueListener(log_queue, logging.StreamHandler())
+    listener.start()
+    atexit.register(listener.stop)  # flushes queued records on exit
+    logger.addHandler(QueueHandler(log_queue))
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+# Shared HTTP client so repeated fetches reuse pooled keep-alive connections.
+# httpx advertises and decodes brotli when the brotli package is installed, and
+# HTTP/2 multiplexes requests to the same host when h2 is installed.
+_HTTP2 = importlib.util.find_spec("h2") is not None
+_TIMEOUT = httpx.Timeout(10.0, connect=3.05)
+
+# Cookies persist across runs so cookie-gated sites skip their consent/set-cookie round-trips
+_COOKIE_FILE = "./.cache/cookies.txt"
+_COOKIE_JAR = http.cookiejar.LWPCookieJar(_COOKIE_FILE)
+if os.path.exists(_COOKIE_FILE):
+    try:
+        _COOKIE_JAR.load(ignore_discard=True)
+    except (http.cookiejar.LoadError, OSError):
+        pass  # Start from an empty jar rather than failing on a corrupt file
+
+@atexit.register
+def _save_cookies():
+    os.makedirs(os.path.dirname(_COOKIE_FILE), exist_ok=True)
+    _COOKIE_JAR.save(ignore_discard=True)
+
+_CLIENT = httpx.Client(
+    http2=_HTTP2,
+    cookies=_COOKIE_JAR,
+    follow_redirects=True,
+    timeout=_TIMEOUT,
+    transport=httpx.HTTPTransport(
+        http2=_HTTP2,
+        retries=3,  # connection failures only; status codes are retried in _get()
+        limits=httpx.Limits(max_connections=64, max_keepalive_connections=32),
+    ),
+)
+_RETRY_STATUSES = {429, 500, 502, 503, 504}
+_MAX_RETRIES = 3
+
+def _get(url: str, headers: dict) -> httpx.Response:
+    """GET with exponential backoff on transient server errors."""
+    for attempt in range(_MAX_RETRIES + 1):
+        response = _CLIENT.get(url, headers=headers)
+        if response.status_code not in _RETRY_STATUSES or attempt == _MAX_RETRIES:
+            return response
+        time.sleep(0.3 * 2 ** attempt)
+
+# Collapses the runs of blank lines left behind by HTML-to-Markdown conversion
+_MULTI_NL_RE = re.compile(r"\n{3,}")
+
+# Pages fetched in earlier sessions: sha1(url) -> (etag, last_modified, markdown)
+_WEBPAGE_CACHE = diskcache.Cache("./.cache/webpages")
+
+def _normalize_url(url: str) -> str:
+    """Drop the fragment and lowercase scheme/host so equivalent URLs share a cache entry."""
+    parts = urlsplit(url.strip())
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path, parts.query, ""))
+
+def _cache_key(url: str) -> str:
+    return hashlib.sha1(url.encode("utf-8")).hexdigest()
+
+def _conditional_headers(cached) -> dict:
+    """Build revalidation headers so the server can answer 304 for our stored copy."""
+    headers = {}
+    if cached is not None:
+        etag, last_modified, _ = cached
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+    return headers
+
+def _html_to_markdown(html: str) -> str:
+    markdown_content = None
+    if trafilatura is not None:
+        # Extract the main content straight to Markdown; lxml-backed, far cheaper than markdownify
+        markdown_content = trafilatura.extract(html, output_format="markdown", include_links=True)
+    if not markdown_content:
+        # Convert the full HTML content to Markdown when extraction finds nothing
+        markdown_content = markdownify(html)
+    markdown_content = markdown_content.strip()
+
+    # Remove multiple line breaks
+    return _MULTI_NL_RE.sub("\n\n", markdown_content)
+
+@functools.lru_cache(maxsize=1)
+def _markdown_pool() -> ProcessPoolExecutor:
+    """Worker processes for HTML-to-Markdown conversion, which is CPU-bound and holds the GIL."""
+    return ProcessPoolExecutor(max_workers=os.cpu_count())
+
+def _store_page(key: str, response_headers, markdown_content: str) -> None:
+    _WEBPAGE_CACHE.set(
+        key,
+        (response_headers.get("ETag"), response_headers.get("Last-Modified"), markdown_content),
+    )
+
+@functools.lru_cache(maxsize=1024)
+def _fetch_markdown(url: str) -> str:
+    """Fetch a normalized URL and convert it to Markdown, revalidating against the disk cache."""
+    key = _cache_key(url)
+    cached = _WEBPAGE_CACHE.get(key)
+
+    # Send a GET request to the URL
+    response = _get(url, _conditional_headers(cached))
+    if response.status_code == 304 and cached is not None:
+        return cached[2]
+    response.raise_for_status()  # Raise an exception for bad status codes
+
+    # The fetch stays on this thread; the conversion runs in parallel with other callers'
+    markdown_content = _markdown_pool().submit(_html_to_markdown, response.text).result()
+    _store_page(key, response.headers, markdown_content)
+    return markdown_content
+
+async def _fetch_markdown_async(client: httpx.AsyncClient, semaphore: asyncio.Semaphore, url: str) -> str:
+    """Async counterpart of `_fetch_markdown` sharing the same disk cache."""
+    key = _cache_key(url)
+    cached = _WEBPAGE_CACHE.get(key)
+
+    async with semaphore:
+        response = await client.get(url, headers=_conditional_headers(cached))
+    if response.status_code == 304 and cached is not None:
+        return cached[2]
+    response.raise_for_status()
+
+    markdown_content = await asyncio.get_running_loop().run_in_executor(
+        _markdown_pool(), _html_to_markdown, response.text
+    )
+    _store_page(key, response.headers, markdown_content)
+    return markdown_content
+
+async def _fetch_all_markdown(urls: list[str]) -> list:
+    """Fetch all URLs concurrently, at most 8 in flight; failures are returned, not raised."""
+    semaphore = asyncio.Semaphore(8)
+    # The client is scoped to the batch because each asyncio.run() call gets a fresh event loop
+    async with httpx.AsyncClient(
+        http2=_HTTP2,
+        cookies=_COOKIE_JAR,
+        follow_redirects=True,
+        timeout=_TIMEOUT,
+        limits=httpx.Limits(max_connections=32, max_keepalive_connections=32),
+    ) as client:
+        return await asyncio.gather(
+            *(_fetch_markdown_async(client, semaphore, url) for url in urls),
+            return_exceptions=True,
+        )
 
 @tool
 def visit_webpage(url: str) -> str:
@@ -46,43 +221,161 @@ def visit_webpage(url: str) -> str:
         The content of the webpage converted to Markdown, or an error message if the request fails.
     """
     try:
-        # Send a GET request to the URL
-        response = requests.get(url)
-        response.raise_for_status()  # Raise an exception for bad status codes
-
-        # Convert the HTML content to Markdown
-        markdown_content = markdownify(response.text).strip()
+        return _fetch_markdown(_normalize_url(url))
 
-        # Remove multiple line breaks
-        markdown_content = re.sub(r"\n{3,}", "\n\n", markdown_content)
-
-        return markdown_content
-
-    except RequestException as e:
+    except httpx.HTTPError as e:
         return f"Error fetching the webpage: {str(e)}"
     except Exception as e:
         return f"An unexpected error occurred: {str(e)}"
 
-def setup_multi_agent_system():
-    """Set up the multi-agent system with a manager agent and a web search agent."""
+@tool
+def visit_webpages(urls: list[str]) -> str:
+    """Visits several webpages concurrently and returns their contents as markdown. Prefer this over repeated visit_webpage calls when you already know all the links you want to read.
+
+    Args:
+        urls: The URLs of the webpages to visit.
+
+    Returns:
+        The Markdown content of each page under a heading with its URL, or an error message for each page that could not be fetched.
+    """
+    results = asyncio.run(_fetch_all_markdown([_normalize_url(url) for url in urls]))
+
+    sections = []
+    for url, result in zip(urls, results):
+        if isinstance(result, httpx.HTTPError):
+            content = f"Error fetching the webpage: {str(result)}"
+        elif isinstance(result, Exception):
+            content = f"An unexpected error occurred: {str(result)}"
+        else:
+            content = result
+        sections.append(f"## {url}\n\n{content}")
+    return "\n\n".join(sections)
+
+class BatchSearchTool(Tool):
+    """Fans independent research tasks out to fresh web search agents running concurrently."""
+
+    name = "batch_search"
+    description = (
+        "Runs several independent web research tasks at the same time, each handled by its own web search agent, "
+        "and returns all of their reports. Use it instead of calling web_search_agent several times in a row "
+        "when the tasks do not depend on each other's results."
+    )
+    inputs = {
+        "queries": {
+            "type": "array",
+            "description": "The independent research tasks to run, one task per item.",
+        }
+    }
+    output_type = "string"
+
+    def __init__(self, agent_factory, max_concurrency: int = 4):
+        """
+        Args:
+            agent_factory: Callable returning a new web search agent. Each task gets its own agent
+                because agents keep per-run memory and cannot be shared between threads.
+            max_concurrency: The maximum number of agents running at once.
+        """
+        super().__init__()
+        self.agent_factory = agent_factory
+        self.max_concurrency = max_concurrency
+
+    def forward(self, queries: list) -> str:
+        reports = asyncio.run(self._run_all(queries))
+
+        sections = []
+        for i, (query, report) in enumerate(zip(queries, reports), start=1):
+            if isinstance(report, Exception):
+                report = f"An unexpected error occurred: {str(report)}"
+            sections.append(f"### Task {i}: {query}\n\n{report}")
+        return "\n\n".join(sections)
+
+    async def _run_all(self, queries: list) -> list:
+        # agent runs are synchronous, so each one gets a worker thread
+        loop = asyncio.get_running_loop()
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            return await asyncio.gather(
+                *(loop.run_in_executor(executor, self._run_one, query) for query in queries),
+                return_exceptions=True,
+            )
+
+    def _run_one(self, query: str) -> str:
+        # Calling the agent (rather than .run) wraps the task and report like a managed agent call
+        return str(self.agent_factory()(query))
+
+class StepBudgetMonitor:
+    """Step callback counting web agent runs that finish on their own versus runs cut off at max_steps.
+
+    The ratio tells whether WEB_AGENT_MAX_STEPS is too tight (many cap hits) or could go lower
+    (runs finish far below it).
+    """
+
+    def __init__(self):
+        self.finished = 0
+        self.cap_hits = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, memory_step, agent=None):
+        if not isinstance(memory_step, ActionStep):
+            return
+        if isinstance(memory_step.error, AgentMaxStepsError):
+            outcome = "hit the step cap"
+            with self._lock:
+                self.cap_hits += 1
+        elif any(call.name == "final_answer" for call in memory_step.tool_calls or []):
+            outcome = f"finished after {memory_step.step_number} steps"
+            with self._lock:
+                self.finished += 1
+        else:
+            return
+        logger.info(f"Web agent {outcome} (finished early: {self.finished}, cap hits: {self.cap_hits})")
+
+WEB_AGENT_MAX_STEPS = 30
+
+def create_model(model_id: str):
+    """Create the model client, preferring a self-hosted vLLM server when VLLM_API_BASE is set.
+
+    vLLM exposes an OpenAI-compatible API, so it is reached through LiteLLM's openai/ provider.
+    The server has to serve the model under the same name (see --served-model-name in the README).
+    """
+    api_base = os.getenv("VLLM_API_BASE")
+    if api_base:
+        return LiteLLMModel(
+            model_id=f"openai/{model_id}",
+            api_base=api_base,
+            api_key=os.getenv("VLLM_API_KEY", "EMPTY"),
+        )
+    return HfApiModel(model_id=model_id)
+
+@functools.lru_cache(maxsize=16)
+def setup_multi_agent_system(model_id: str = "Qwen/QwQ-32B"):
+    """Set up the multi-agent system with a manager agent and a web search agent.
+
+    Systems are memoized per model_id, so asking for the same configuration again
+    reuses the existing model client, tools and agents instead of rebuilding them.
+    """
     
-    # Using Qwen's model for all agents
-    #model_id = "Qwen/Qwen2.5-Coder-32B-Instruct"
-    model_id = "Qwen/QwQ-32B"
-    model = HfApiModel(model_id=model_id)
+    # Using Qwen's model for all agents (e.g. "Qwen/Qwen2.5-Coder-32B-Instruct" also works)
+    model = create_model(model_id)
+    warm_up_model(model)
     
-    # Create the web search agent - visit_webpage is already a Tool instance due to @tool decorator
-    web_agent = ToolCallingAgent(
-        tools=[DuckDuckGoSearchTool(), visit_webpage],
-        model=model,
-        max_steps=200,
-        name="web_search_agent",
-        description="Runs web searches for you."
-    )
+    # Create the web search agent - visit_webpage(s) are already Tool instances due to @tool decorator
+    step_monitor = StepBudgetMonitor()
+
+    def make_web_agent():
+        return ToolCallingAgent(
+            tools=[CachedDuckDuckGoSearchTool(), visit_webpage, visit_webpages],
+            model=model,
+            max_steps=WEB_AGENT_MAX_STEPS,
+            step_callbacks=[step_monitor],
+            name="web_search_agent",
+            description="Runs web searches for you."
+        )
+
+    web_agent = make_web_agent()
     
-    # Create the manager agent
+    # Create the manager agent; batch_search runs independent searches on their own agents in parallel
     manager_agent = CodeAgent(
-        tools=[],
+        tools=[BatchSearchTool(make_web_agent)],
         model=model,
         managed_agents=[web_agent],
         additional_authorized_imports=["time", "numpy", "pandas"],
@@ -92,8 +385,8 @@ def setup_multi_agent_system():
 
 def run_query(manager_agent, query):
     """Run a query through the manager agent and print the response."""
-    print(f"Query: {query}\n")
-    print("Processing...\n")
+    logger.info(f"Query: {query}\n")
+    logger.info("Processing...\n")
     answer = manager_agent.run(query)
     print("Answer:")
     print("-" * 80)
@@ -101,6 +394,22 @@ def run_query(manager_agent, query):
     print("-" * 80)
     return answer
 
+_HF_LOGGED_IN = False
+
+def hf_login(token=None):
+    """Log in to Hugging Face at most once per process."""
+    global _HF_LOGGED_IN
+    if _HF_LOGGED_IN:
+        return
+
+    if token:
+        login(token=token, add_to_git_credential=False)
+        logger.info("Successfully logged in to Hugging Face using token from .env file")
+    else:
+        logger.info("No HF_TOKEN found in .env file. Please log in manually:")
+        login()
+    _HF_LOGGED_IN = True
+
 def main():
     """Main function to run the multi-agent system."""
     
@@ -109,22 +418,16 @@ def main():
     # import subprocess
     # subprocess.run(["pip", "install", "markdownify", "duckduckgo-search", "smolagents", "python-dotenv", "--upgrade", "-q"])
     
+    setup_logging()
+
     # Load environment variables from .env file
     load_dotenv()
     
-    # Get token from environment variable
-    token = os.getenv("HF_TOKEN")
-    
     # Log in to Hugging Face using token from .env
-    if token:
-        login(token=token, add_to_git_credential=False)
-        print("Successfully logged in to Hugging Face using token from .env file")
-    else:
-        print("No HF_TOKEN found in .env file. Please log in manually:")
-        login()
+    hf_login(os.getenv("HF_TOKEN"))
     
     # Set up the multi-agent system
-    print("Setting up multi-agent system...")
+    logger.info("Setting up multi-agent system...")
     manager_agent = setup_multi_agent_system()
     
     # Example query
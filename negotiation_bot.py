@@ -1,111 +1,294 @@
-import io
-from contextlib import redirect_stdout
 import gradio as gr
 from smolagents import (
-    load_tool,
     CodeAgent,
-    ToolCallingAgent,
-    VLLMModel,
-    DuckDuckGoSearchTool,
-    VisitWebpageTool,
-    HfApiModel, 
+    HfApiModel,
     GradioUI,
     AgentLogger,
     LogLevel
 )
+from smolagents.gradio_ui import stream_to_gradio
 
-from smolagents.models import MLXModel
-
+import os
 import re
 import html
-import datetime
+import shutil
+import functools
+import uuid
+import asyncio
+import subprocess
+import aiofiles
+import orjson
+from dataclasses import dataclass
 
-def save_conversation_to_file(conversation, filename="~/data/final_negotiation.txt"):
-    os.makedirs(os.path.expanduser("~/data"), exist_ok=True)
-    full_path = os.path.expanduser(filename)
-    with open(full_path, "w") as f:
-        for msg in conversation:
-            f.write(f"{msg['role']}: {msg['content']}\n")
-    return full_path
+_DATA_DIR = os.path.expanduser("~/data")
+os.makedirs(_DATA_DIR, exist_ok=True)
+_FINAL_PATH = os.path.join(_DATA_DIR, "final_negotiation.jsonl")
 
-import subprocess
+@dataclass(slots=True)
+class SessionState:
+    """Per-session data kept in gr.State: the agent and this session's conversation log"""
+    agent: object = None
+    log_fh: object = None
+    log_path: str = None
+    flushed: int = 0
+
+def _message_record(msg):
+    # Gradio hands back dicts, while messages streamed during this turn are still gr.ChatMessage objects
+    if isinstance(msg, dict):
+        return {"role": msg["role"], "content": msg["content"]}
+    return {"role": msg.role, "content": msg.content}
+
+async def save_conversation_to_file(conversation, session_state, filename=_FINAL_PATH):
+    """Append the messages not yet written for this session to its JSONL log through the open file.
+
+    Each session gets its own log, named after filename with a random session id added, so
+    concurrent negotiations never interleave and each upload holds one conversation. The session
+    opens it once and keeps the handle in session_state, so later turns only write their new
+    messages. The handle is unbuffered, so the data is in the file as soon as the write returns
+    and the upload never sees a partial turn.
+    """
+    if session_state.log_fh is None:
+        # Chosen here rather than in SessionState, whose default gr.State copies into every session
+        root, ext = os.path.splitext(filename)
+        session_state.log_path = f"{root}-{uuid.uuid4().hex}{ext}"
+        session_state.log_fh = await aiofiles.open(session_state.log_path, "wb", buffering=0)
+
+    # One JSON object per message; content that is not plain text (files, components) is stored as its str()
+    buf = b"".join(
+        orjson.dumps(_message_record(msg), default=str) + b"\n" for msg in conversation[session_state.flushed:]
+    )
+    await session_state.log_fh.write(buf)
+    session_state.flushed = len(conversation)
+    return session_state.log_path
+
+def _close_session_log(session_state):
+    """gr.State delete callback: close the session's log handle when the session ends."""
+    fh = session_state.log_fh
+    if fh is None:
+        return
+    session_state.log_fh = None
+    try:
+        asyncio.get_running_loop().create_task(fh.close())
+    except RuntimeError:
+        # Called outside the event loop
+        asyncio.run(fh.close())
 
-def run_terminal_command(file_path):
-    command = [
-        "recall",
-        "bucket",
-        "add",
-        "--address", "0xff00000000000000000000000000000000000109",
-        "--key", "hello/world",
-        file_path
-    ]
-    result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    return result.stdout.decode(), result.stderr.decode()
-
-def save_and_run(chat_history):
-    file_path = save_conversation_to_file(chat_history)
-    stdout, stderr = run_terminal_command(file_path)
-    print("Recall Output:", stdout)
-    if stderr:
-        print("Recall Error:", stderr)
+# Resolved once so each upload skips the PATH search and reuses the same argv prefix
+_RECALL_ARGV_PREFIX = (
+    shutil.which("recall") or "recall",
+    "bucket",
+    "add",
+    "--address", "0xff00000000000000000000000000000000000109",
+    "--key", "hello/world",
+)
+
+# The recall CLI's output is only read when debugging; otherwise it goes straight to /dev/null
+_CAPTURE_RECALL_OUTPUT = os.getenv("DEBUG", "").lower() in {"1", "true", "yes"}
+
+async def run_terminal_command(file_path, capture=False):
+    command = _RECALL_ARGV_PREFIX + (file_path,)
+    # Run the CLI without blocking the event loop so the UI keeps responding during the upload
+    output = subprocess.PIPE if capture else subprocess.DEVNULL
+    # close_fds=False with an absolute executable lets Popen launch through posix_spawn
+    proc = await asyncio.create_subprocess_exec(*command, stdout=output, stderr=output, close_fds=False)
+    stdout, stderr = await proc.communicate()
+    if not capture:
+        return "", f"recall exited with status {proc.returncode}" if proc.returncode else ""
+    return stdout.decode(), stderr.decode()
+
+# Uploads run on one background task so a turn never waits on the recall CLI
+_UPLOAD_QUEUE_SIZE = 64
+_upload_queue = None
+_uploader = None
+
+async def _drain_uploads(queue):
+    while True:
+        # Collapse everything queued since the last upload; re-uploading a path only needs its latest contents
+        pending = {await queue.get()}
+        while not queue.empty():
+            pending.add(queue.get_nowait())
+        for file_path in pending:
+            try:
+                stdout, stderr = await run_terminal_command(file_path, capture=_CAPTURE_RECALL_OUTPUT)
+            except Exception as e:
+                stdout, stderr = "", str(e)
+            if stdout:
+                print("Recall Output:", stdout)
+            if stderr:
+                print("Recall Error:", stderr)
+
+def _get_upload_queue():
+    global _upload_queue, _uploader
+    if _upload_queue is None:
+        _upload_queue = asyncio.Queue(maxsize=_UPLOAD_QUEUE_SIZE)
+        _uploader = asyncio.get_running_loop().create_task(_drain_uploads(_upload_queue))
+    return _upload_queue
+
+async def save_and_run(chat_history, session_state):
+    file_path = await save_conversation_to_file(chat_history, session_state)
+    await _get_upload_queue().put(file_path)
     return chat_history
 
 
-# Set up your model and logger
-model = HfApiModel()
+# Set up your logger
 logger = AgentLogger(level=LogLevel.INFO)
 
-agent_party_b = CodeAgent(
-    tools=[],
-    model=model,
-    name="agent_party_b",
-    description="You are Dr. Daniel Faraday's negotiation agent seeking favorable research terms for a physicist specializing in time-space anomalies; require research autonomy, equipment access, publication pathways, safety protocols, and return guarantees; prioritize unique research access over compensation; authorized to accept agreements meeting all non-negotiables and addressing 60 percent of key questions satisfactorily.",
-    max_steps=12,
-    verbosity_level=1,
-    planning_interval=4
-)
+# Negotiation briefs for each party, used as the agents' descriptions
+_DESC_A = "Work with Dr. Daniel Faraday's Agent. You are Dr. Juliet Burke's negotiation agent seeking qualified researchers (PhD required, 6-month commitment, top-secret clearance) for confidential island medical research; prioritize security and minimal information disclosure while offering unique research opportunities, competitive compensation, and publication rights (with review); authorized to finalize agreements meeting all non-negotiables and 70 percent of strategic goals."
 
-# Create a manager agent that can create more agents
-agent_party_a = CodeAgent(
-    tools=[],
-    managed_agents=[agent_party_b],
-    model=model,
-    name="agent_party_a",
-    description="Work with Dr. Daniel Faraday's Agent. You are Dr. Juliet Burke's negotiation agent seeking qualified researchers (PhD required, 6-month commitment, top-secret clearance) for confidential island medical research; prioritize security and minimal information disclosure while offering unique research opportunities, competitive compensation, and publication rights (with review); authorized to finalize agreements meeting all non-negotiables and 70 percent of strategic goals.",
-    max_steps=12,
-    verbosity_level=1,
-    planning_interval=4
-)
+_DESC_B = "You are Dr. Daniel Faraday's negotiation agent seeking favorable research terms for a physicist specializing in time-space anomalies; require research autonomy, equipment access, publication pathways, safety protocols, and return guarantees; prioritize unique research access over compensation; authorized to accept agreements meeting all non-negotiables and addressing 60 percent of key questions satisfactorily."
+
+@functools.lru_cache(maxsize=1)
+def build_agents():
+    """Create the model and both negotiation agents once per process and return the manager agent."""
+    model = HfApiModel()
+
+    agent_party_b = CodeAgent(
+        tools=[],
+        model=model,
+        name="agent_party_b",
+        description=_DESC_B,
+        max_steps=12,
+        verbosity_level=1,
+        planning_interval=4
+    )
+
+    # Create a manager agent that can create more agents
+    agent_party_a = CodeAgent(
+        tools=[],
+        managed_agents=[agent_party_b],
+        model=model,
+        name="agent_party_a",
+        description=_DESC_A,
+        max_steps=12,
+        verbosity_level=1,
+        planning_interval=4
+    )
+    return agent_party_a
 
 
 
 # Capture agent visualization
 
 
+_ANSI_RE = re.compile(r'\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])')
+
 def clean_ansi_codes(text):
     """Remove ANSI color codes for clean display"""
-    ansi_escape = re.compile(r'\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])')
-    return ansi_escape.sub('', text)
+    return _ANSI_RE.sub('', text)
+
+# Widen the tree-drawing characters in a single pass instead of three chained replaces
+_TREE_RE = re.compile("├──|└──|│")
+_TREE_MAP = {"├──": "├─ ", "└──": "└─ ", "│": "│ "}
+
+_PRE_TEMPLATE = "<pre style='font-family: monospace; white-space: pre; font-size: 14px;'>{}</pre>"
+
+def agent_tree_to_html(text):
+    """Render a plain-text agent tree as a monospace HTML block"""
+    return _PRE_TEMPLATE.format(html.escape(_TREE_RE.sub(lambda m: _TREE_MAP[m.group(0)], clean_ansi_codes(text))))
+
+# Static sidebar and tab content, built once at import instead of on every launch()
+_SIDEBAR_INTRO_MD = "\n> This web UI allows you to interact with a `smolagents` agent that can use tools and execute steps to complete tasks."
+
+_POWERED_BY_HTML = """<div style="display: flex; align-items: center; gap: 8px; font-family: system-ui, -apple-system, sans-serif;">
+                <img src="https://huggingface.co/datasets/huggingface/documentation-images/resolve/main/smolagents/mascot_smol.png" style="width: 32px; height: 32px; object-fit: contain;" alt="logo">
+                <a target="_blank" href="https://github.com/huggingface/smolagents"><b>huggingface/smolagents</b></a>
+                </div>"""
+
+_MONITORING_MD = """
+                ### Monitoring Information
+                
+                This tab shows the structure of your agent, including:
+                - Hierarchical organization of agents
+                - Available tools for each agent
+                - Agent configurations
+                
+                Use the refresh button to update the visualization if you modify your agent structure.
+                """
+
+_PROMPT_PLACEHOLDER = "Enter your prompt here and press Shift+Enter or press the button"
+_TEXTBOX_REENABLE = gr.update(interactive=True, placeholder=_PROMPT_PLACEHOLDER)
+_BUTTON_REENABLE = gr.update(interactive=True)
+
+# Marks the end of interact_with_agent when it is advanced from a worker thread
+_TURN_DONE = object()
 
 # Create a custom Gradio UI that extends the GradioUI class
 class MonitoringGradioUI(GradioUI):
     def __init__(self, agent, file_upload_folder=None):
         super().__init__(agent, file_upload_folder)
         self.name = "Agent Interface with Monitoring"
+
+    async def run_turn(self, text, file_uploads_log, chat_history, session_state):
+        """Handle a whole turn in one event: log the message, stream the agent, save, re-enable input.
+
+        This replaces a chain of .then() events, each of which was a separate round trip that
+        re-sent the chatbot and session state.
+        """
+        prompt, textbox, button = self.log_user_message(text, file_uploads_log)
+        yield chat_history, textbox, button
+
+        # interact_with_agent is a blocking generator, so advance it off the event loop
+        steps = self.interact_with_agent(prompt, chat_history, session_state)
+        next_messages = None
+        saved = False
+        try:
+            while True:
+                next_messages = asyncio.ensure_future(asyncio.to_thread(next, steps, _TURN_DONE))
+                # Shielded so a disconnect cancels only this wait, not the step in the worker thread
+                if (messages := await asyncio.shield(next_messages)) is _TURN_DONE:
+                    break
+                chat_history = messages
+                yield chat_history, gr.update(), gr.update()
+
+            await save_and_run(chat_history, session_state)
+            saved = True
+            # Plain update dicts re-enable the inputs without constructing new components
+            yield chat_history, _TEXTBOX_REENABLE, _BUTTON_REENABLE
+        finally:
+            # The client may have gone away mid-turn. Let the step already running in the worker
+            # thread finish, since a generator cannot be closed while it is executing, then close
+            # the agent run and still save what the turn produced.
+            if next_messages is not None and not next_messages.done():
+                try:
+                    await next_messages
+                except Exception:
+                    pass
+            steps.close()
+            if not saved:
+                await save_and_run(chat_history, session_state)
+
+    def interact_with_agent(self, prompt, messages, session_state):
+        """Stream the agent's messages to the chat, using the SessionState attributes instead of dict keys"""
+        if session_state.agent is None:
+            session_state.agent = self.agent
+
+        try:
+            messages.append(gr.ChatMessage(role="user", content=prompt))
+            yield messages
+
+            for msg in stream_to_gradio(session_state.agent, task=prompt, reset_agent_memory=False):
+                messages.append(msg)
+                yield messages
+
+            yield messages
+        except Exception as e:
+            print(f"Error in interaction: {str(e)}")
+            messages.append(gr.ChatMessage(role="assistant", content=f"Error: {str(e)}"))
+            yield messages
         
     def launch(self, share=True, **kwargs):
         with gr.Blocks(theme="ocean", fill_height=True) as demo:
             # Add session state to store session-specific data
-            session_state = gr.State({})
-            stored_messages = gr.State([])
+            session_state = gr.State(SessionState(), delete_callback=_close_session_log)
             file_uploads_log = gr.State([])
             
             with gr.Tab("Chat"):
                 with gr.Sidebar():
                     gr.Markdown(
-                        f"# {self.name.replace('_', ' ').capitalize()}"
-                        "\n> This web UI allows you to interact with a `smolagents` agent that can use tools and execute steps to complete tasks."
-                        + (f"\n\n**Agent description:**\n{self.description}" if self.description else "")
+                        "# " + self.name.replace('_', ' ').capitalize()
+                        + _SIDEBAR_INTRO_MD
+                        + ("\n\n**Agent description:**\n" + self.description if self.description else "")
                     )
 
                     with gr.Group():
@@ -114,7 +297,7 @@ class MonitoringGradioUI(GradioUI):
                             lines=3,
                             label="Chat Message",
                             container=False,
-                            placeholder="Enter your prompt here and press Shift+Enter or press the button",
+                            placeholder=_PROMPT_PLACEHOLDER,
                         )
                         submit_btn = gr.Button("Submit", variant="primary")
 
@@ -130,10 +313,7 @@ class MonitoringGradioUI(GradioUI):
 
                     gr.HTML("<br><br><h4><center>Powered by:</center></h4>")
                     with gr.Row():
-                        gr.HTML("""<div style="display: flex; align-items: center; gap: 8px; font-family: system-ui, -apple-system, sans-serif;">
-                <img src="https://huggingface.co/datasets/huggingface/documentation-images/resolve/main/smolagents/mascot_smol.png" style="width: 32px; height: 32px; object-fit: contain;" alt="logo">
-                <a target="_blank" href="https://github.com/huggingface/smolagents"><b>huggingface/smolagents</b></a>
-                </div>""")
+                        gr.HTML(_POWERED_BY_HTML)
 
                 # Main chat interface
                 chatbot = gr.Chatbot(
@@ -147,83 +327,43 @@ class MonitoringGradioUI(GradioUI):
                     scale=1,
                 )
                 
-                # Set up event handlers
-                text_input.submit(
-                    self.log_user_message,
-                    [text_input, file_uploads_log],
-                    [stored_messages, text_input, submit_btn],
-                ).then(self.interact_with_agent, [stored_messages, chatbot, session_state], [chatbot]).then(
-                    save_and_run, [chatbot], [chatbot]
-                ).then(
-                    lambda: (
-                        gr.Textbox(
-                            interactive=True, placeholder="Enter your prompt here and press Shift+Enter or the button"
-                        ),
-                        gr.Button(interactive=True),
-                    ),
-                    None,
-                    [text_input, submit_btn],
-                )
-
-                submit_btn.click(
-                    self.log_user_message,
-                    [text_input, file_uploads_log],
-                    [stored_messages, text_input, submit_btn],
-                ).then(self.interact_with_agent, [stored_messages, chatbot, session_state], [chatbot]).then(
-                    lambda: (
-                        gr.Textbox(
-                            interactive=True, placeholder="Enter your prompt here and press Shift+Enter or the button"
-                        ),
-                        gr.Button(interactive=True),
-                    ),
-                    None,
-                    [text_input, submit_btn],
+                # Set up event handlers; pressing Shift+Enter and clicking Submit share one event
+                gr.on(
+                    triggers=[text_input.submit, submit_btn.click],
+                    fn=self.run_turn,
+                    inputs=[text_input, file_uploads_log, chatbot, session_state],
+                    outputs=[chatbot, text_input, submit_btn],
                 )
             
             # Add the Monitoring tab
             # with gr.Tab("Agent Monitoring"):
-            #     # Get the visualization text
-            #     agent_viz = get_agent_visualization()
-            #     agent_viz_clean = clean_ansi_codes(agent_viz)
-                
-            #     # Convert the tree characters to HTML with proper formatting
-            #     html_viz = agent_viz_clean.replace("├──", "├─ ").replace("└──", "└─ ").replace("│", "│ ")
-            #     html_viz = html.escape(html_viz)
-            #     html_viz = f"<pre style='font-family: monospace; white-space: pre; font-size: 14px;'>{html_viz}</pre>"
-                
-            #     viz_html = gr.HTML(value=html_viz)
+            #     # Get the visualization text and convert the tree to HTML with proper formatting
+            #     viz_html = gr.HTML(value=agent_tree_to_html(get_agent_visualization()))
                 
             #     # Add a refresh button
             #     refresh_btn = gr.Button("Refresh Agent Tree")
                 
             #     def refresh_viz():
-            #         new_viz = get_agent_visualization()
-            #         new_viz_clean = clean_ansi_codes(new_viz)
-            #         html_viz = new_viz_clean.replace("├──", "├─ ").replace("└──", "└─ ").replace("│", "│ ")
-            #         html_viz = html.escape(html_viz)
-            #         html_viz = f"<pre style='font-family: monospace; white-space: pre; font-size: 14px;'>{html_viz}</pre>"
-            #         return html_viz
+            #         return agent_tree_to_html(get_agent_visualization())
                 
             #     refresh_btn.click(refresh_viz, None, viz_html)
                 
                 # Add some explanatory text
-                gr.Markdown("""
-                ### Monitoring Information
-                
-                This tab shows the structure of your agent, including:
-                - Hierarchical organization of agents
-                - Available tools for each agent
-                - Agent configurations
-                
-                Use the refresh button to update the visualization if you modify your agent structure.
-                """)
+                gr.Markdown(_MONITORING_MD)
 
         demo.launch(debug=True, share=share, **kwargs)
 
-# Create and launch your UI
-# Make sure uploads directory exists
-import os
-os.makedirs("./uploads", exist_ok=True)
+if __name__ == "__main__":
+    # Use libuv's event loop for every asyncio loop created from here on, if it is installed
+    try:
+        import uvloop
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    except ImportError:
+        pass
+
+    # Create and launch your UI
+    # Make sure uploads directory exists
+    os.makedirs("./uploads", exist_ok=True)
 
-ui = MonitoringGradioUI(agent_party_a, file_upload_folder="./uploads")
-ui.launch(share=True)  # Set share=False if you don't want to create a public link
\ No newline at end of file
+    ui = MonitoringGradioUI(build_agents(), file_upload_folder="./uploads")
+    ui.launch(share=os.environ.get("DHARMA_SHARE") == "1")  # Set DHARMA_SHARE=1 to create a public link
\ No newline at end of file
@@ -1,12 +1,9 @@
-import io
-from contextlib import redirect_stdout
 import gradio as gr
 from smolagents import (
     load_tool,
     CodeAgent,
     ToolCallingAgent,
     VLLMModel,
-    DuckDuckGoSearchTool,
     VisitWebpageTool,
     HfApiModel, 
     GradioUI,
@@ -15,9 +12,11 @@ from smolagents import (
 )
 
 from smolagents.models import MLXModel
+from smolagents.gradio_ui import stream_to_gradio
+
+from tools.cached_search import CachedDuckDuckGoSearchTool
+from tools.model_warmup import warm_up_model
 
-import re
-import html
 import datetime
 
 def save_conversation_to_file(conversation, filename="~/data/hello.txt"):
@@ -53,6 +52,7 @@ def save_and_run(chat_history):
 
 # Set up your model and logger
 model = HfApiModel()
+warm_up_model(model)
 logger = AgentLogger(level=LogLevel.INFO)
 
 # Import tool from Hub
@@ -69,7 +69,7 @@ security_agent = ToolCallingAgent(
 )
 
 researcher_screening_agent = ToolCallingAgent(
-    tools=[DuckDuckGoSearchTool(), VisitWebpageTool()],
+    tools=[CachedDuckDuckGoSearchTool(), VisitWebpageTool()],
     model=model,
     name="researcher_screening_agent",
     description="Searches for and evaluates potential research candidates based on qualifications, publications, and compatibility",
@@ -126,23 +126,56 @@ manager_agent = CodeAgent(
 # --key "hello/world" \
 # ~/data/hello.txt
 
-# Capture agent visualization
-def get_agent_visualization():
-    buffer = io.StringIO()
-    with redirect_stdout(buffer):
-        logger.visualize_agent_tree(manager_agent)
-    return buffer.getvalue()
-
-def clean_ansi_codes(text):
-    """Remove ANSI color codes for clean display"""
-    ansi_escape = re.compile(r'\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])')
-    return ansi_escape.sub('', text)
+# Describe the agent structure as data; gr.JSON renders it as a collapsible tree in the browser
+def agent_to_json(agent, name=None):
+    """Build a JSON-serializable tree of an agent, its tools and its managed agents"""
+    node = {
+        "name": name or getattr(agent, "name", None) or agent.__class__.__name__,
+        "type": agent.__class__.__name__,
+        "model": getattr(agent.model, "model_id", None),
+    }
+    if name is not None:
+        node["description"] = getattr(agent, "description", None)
+    if agent.__class__.__name__ == "CodeAgent":
+        node["authorized_imports"] = agent.additional_authorized_imports
+    node["tools"] = [
+        {"name": tool_name, "description": tool.description, "inputs": list(tool.inputs)}
+        for tool_name, tool in agent.tools.items()
+    ]
+    node["children"] = [
+        agent_to_json(managed_agent, managed_name)
+        for managed_name, managed_agent in agent.managed_agents.items()
+    ]
+    return node
 
 # Create a custom Gradio UI that extends the GradioUI class
 class MonitoringGradioUI(GradioUI):
     def __init__(self, agent, file_upload_folder=None):
         super().__init__(agent, file_upload_folder)
         self.name = "Agent Interface with Monitoring"
+
+    def interact_with_agent(self, prompt, messages, session_state):
+        """Stream the agent's messages to the chat, repainting once per completed step"""
+        if "agent" not in session_state:
+            session_state["agent"] = self.agent
+
+        try:
+            messages.append(gr.ChatMessage(role="user", content=prompt))
+            yield messages
+
+            for msg in stream_to_gradio(session_state["agent"], task=prompt, reset_agent_memory=False):
+                messages.append(msg)
+                # A step's messages all arrive together and end with a "-----" separator,
+                # so flushing there costs no latency but saves a repaint per message
+                if msg.content == "-----":
+                    yield messages
+
+            # Flush the final answer and anything after the last separator
+            yield messages
+        except Exception as e:
+            print(f"Error in interaction: {str(e)}")
+            messages.append(gr.ChatMessage(role="assistant", content=f"Error: {str(e)}"))
+            yield messages
         
     def launch(self, share=True, **kwargs):
         with gr.Blocks(theme="ocean", fill_height=True) as demo:
@@ -233,29 +266,17 @@ class MonitoringGradioUI(GradioUI):
             
             # Add the Monitoring tab
             with gr.Tab("Agent Monitoring"):
-                # Get the visualization text
-                agent_viz = get_agent_visualization()
-                agent_viz_clean = clean_ansi_codes(agent_viz)
-                
-                # Convert the tree characters to HTML with proper formatting
-                html_viz = agent_viz_clean.replace("├──", "├─ ").replace("└──", "└─ ").replace("│", "│ ")
-                html_viz = html.escape(html_viz)
-                html_viz = f"<pre style='font-family: monospace; white-space: pre; font-size: 14px;'>{html_viz}</pre>"
-                
-                viz_html = gr.HTML(value=html_viz)
+                # Ship the agent tree as data; the browser renders and collapses it
+                viz_json = gr.JSON(value=agent_to_json(manager_agent), label="Agent Tree")
                 
                 # Add a refresh button
                 refresh_btn = gr.Button("Refresh Agent Tree")
                 
                 def refresh_viz():
-                    new_viz = get_agent_visualization()
-                    new_viz_clean = clean_ansi_codes(new_viz)
-                    html_viz = new_viz_clean.replace("├──", "├─ ").replace("└──", "└─ ").replace("│", "│ ")
-                    html_viz = html.escape(html_viz)
-                    html_viz = f"<pre style='font-family: monospace; white-space: pre; font-size: 14px;'>{html_viz}</pre>"
-                    return html_viz
+                    return agent_to_json(manager_agent)
                 
-                refresh_btn.click(refresh_viz, None, viz_html)
+                # Own small lane so refreshes never wait behind long agent runs
+                refresh_btn.click(refresh_viz, None, viz_json, concurrency_limit=2, concurrency_id="monitoring")
                 
                 # Add some explanatory text
                 gr.Markdown("""
@@ -269,7 +290,9 @@ class MonitoringGradioUI(GradioUI):
                 Use the refresh button to update the visualization if you modify your agent structure.
                 """)
 
-        demo.launch(debug=True, share=share, **kwargs)
+        # Every session shares manager_agent and its memory, so chat events keep Gradio's default of
+        # one run at a time; only the monitoring lane above runs alongside them
+        demo.queue(max_size=64).launch(debug=True, share=share, **kwargs)
 
 # Create and launch your UI
 # Make sure uploads directory exists
@@ -1,6 +1,9 @@
 import os
+import re
 import time
+import asyncio
 import json
+from string import Template
 from typing import Dict, List, Optional, Any, Generator
 
 import gradio as gr
@@ -8,6 +11,180 @@ import gradio as gr
 from smolagents.agents import ActionStep, MultiStepAgent
 from smolagents.gradio_ui import GradioUI, stream_to_gradio, pull_messages_from_step
 
+# Matches managed agent calls in generated code, like: search_agent.run("query")
+_AGENT_CALL_RE = re.compile(r'(\w+)\.run\([\'"]([^\'"]+)[\'"]')
+
+# <head> markup for the agent graph, filled with the initial node and link JSON.
+# A string.Template keeps the JavaScript braces literal.
+_VIZ_TEMPLATE = Template("""
+<script src="https://d3js.org/d3.v7.min.js"></script>
+<script>
+(function() {
+    // Graph data merged from patches, keyed by agent id. Positions (fx, fy) are computed in
+    // Python, so the browser only draws: there is no force simulation to run.
+    const nodesById = new Map();
+    let links = [];
+    let pending = [];
+    let svg = null, g = null;
+
+    function init(el) {
+        // Get the container dimensions
+        const width = el.getBoundingClientRect().width;
+        const height = el.getBoundingClientRect().height;
+
+        // Create the SVG
+        svg = d3.select(el).append("svg")
+            .attr("width", width)
+            .attr("height", height)
+            .attr("viewBox", [0, 0, width, height]);
+
+        // Create a group for everything, with links drawn below nodes
+        g = svg.append("g");
+        g.append("g").attr("class", "links");
+        g.append("g").attr("class", "nodes");
+
+        // Add zoom capabilities
+        svg.call(d3.zoom().on("zoom", function(event) {
+            g.attr("transform", event.transform);
+        }));
+    }
+
+    // Place links and nodes at their current positions
+    function position() {
+        g.select(".links").selectAll("line")
+            .attr("x1", function(d) { return nodesById.get(d.source).x; })
+            .attr("y1", function(d) { return nodesById.get(d.source).y; })
+            .attr("x2", function(d) { return nodesById.get(d.target).x; })
+            .attr("y2", function(d) { return nodesById.get(d.target).y; });
+
+        g.select(".nodes").selectAll("g.agent")
+            .attr("transform", function(d) { return "translate(" + d.x + "," + d.y + ")"; });
+    }
+
+    // Drag behavior: move the node locally until the server assigns it a new position
+    function drag() {
+        return d3.drag().on("drag", function(event) {
+            event.subject.x = event.x;
+            event.subject.y = event.y;
+            position();
+        });
+    }
+
+    function render(topologyChanged) {
+        const nodes = Array.from(nodesById.values());
+
+        // Create nodes for new agents only; existing ones keep their elements
+        const node = g.select(".nodes").selectAll("g.agent")
+            .data(nodes, function(d) { return d.id; })
+            .join(function(enter) {
+                const added = enter.append("g").attr("class", "agent").call(drag());
+                added.append("circle").attr("stroke", "#fff").attr("stroke-width", 2);
+                added.append("text")
+                    .attr("text-anchor", "middle")
+                    .attr("dy", ".3em")
+                    .attr("fill", "white")
+                    .attr("font-weight", "bold");
+                added.append("title");
+                return added;
+            });
+
+        node.select("circle")
+            .attr("r", function(d) { return d.is_manager ? 30 : 25; })
+            .attr("fill", function(d) { return d.color; });
+        node.select("text").text(function(d) { return d.name; });
+        node.select("title").text(function(d) {
+            return "Agent: " + d.name + 
+                   "\\nStatus: " + d.status + 
+                   "\\nTask: " + d.task + 
+                   "\\nSteps: " + d.steps + 
+                   "\\nTokens: " + d.tokens + 
+                   "\\nTool Calls: " + d.tool_calls + 
+                   "\\nTime: " + d.time_spent;
+        });
+
+        // Only rebind the links when agents or links were added
+        if (topologyChanged) {
+            g.select(".links").selectAll("line")
+                .data(links.filter(function(l) { return nodesById.has(l.source) && nodesById.has(l.target); }))
+                .join("line")
+                .attr("stroke", "#999")
+                .attr("stroke-opacity", 0.6)
+                .attr("stroke-width", 2);
+        }
+        position();
+    }
+
+    function apply(patch) {
+        let topologyChanged = false;
+        if (patch.reset) {
+            nodesById.clear();
+            topologyChanged = true;
+        }
+        (patch.nodes || []).forEach(function(n) {
+            const existing = nodesById.get(n.id);
+            if (existing) {
+                // Keep a dragged position unless the layout itself moved the node
+                const moved = existing.fx !== n.fx || existing.fy !== n.fy;
+                Object.assign(existing, n);
+                if (moved) {
+                    existing.x = n.fx;
+                    existing.y = n.fy;
+                }
+            } else {
+                nodesById.set(n.id, Object.assign({x: n.fx, y: n.fy}, n));
+                topologyChanged = true;
+            }
+        });
+        if (patch.links) {
+            links = patch.links;
+            topologyChanged = true;
+        }
+        render(topologyChanged);
+    }
+
+    function flush() {
+        const el = document.getElementById("agent-visualization");
+        // Wait for both D3 and the Gradio-mounted container
+        if (!el || typeof d3 === "undefined") {
+            setTimeout(flush, 100);
+            return;
+        }
+        if (!svg) init(el);
+        const queued = pending;
+        pending = [];
+        queued.forEach(apply);
+    }
+
+    window.updateAgentGraph = function(patch) {
+        if (!patch) return;
+        pending.push(patch);
+        if (pending.length === 1) flush();
+    };
+
+    // Draw the graph as it was at launch; the page load then sends the current state
+    window.updateAgentGraph({reset: true, nodes: $nodes_json, links: $links_json});
+})();
+</script>
+
+""")
+
+def _task_preview(task: str) -> str:
+    """Collapse whitespace and trim a task to the 50-character preview shown in the graph"""
+    task = " ".join(task.split())
+    return task[:50] + "..." if len(task) > 50 else task
+
+# Node colors by status; any other status is drawn gray
+_STATUS_COLORS = {"active": "#4CAF50", "completed": "#8BC34A"}  # Green, light green
+
+# Minimum seconds between visualization updates while an agent is streaming
+VIZ_MIN_INTERVAL = 0.12
+
+# Parents with more children than this draw their non-active children as one cluster node
+MAX_RENDERED_NODES = 50
+
+# Returned by next() once the agent's run has no more steps
+_RUN_DONE = object()
+
 
 class SuperGradioUI(GradioUI):
     """An extended Gradio UI that visualizes the manager agent and its sub-agents with a persistent graph"""
@@ -22,12 +199,32 @@ class SuperGradioUI(GradioUI):
             if not os.path.exists(file_upload_folder):
                 os.mkdir(file_upload_folder)
         
-        # Agent tracking data
-        self.agent_hierarchy = {}  # Store the hierarchy of agents {name: parent_name}
-        self.agent_tasks = {}      # Store tasks assigned to each agent {name: task}
-        self.agent_statuses = {}   # Store the status of each agent {name: status}
-        self.agent_metrics = {}    # Store metrics like tokens, time spent, etc.
-        self.agent_start_times = {}  # Track when agents started working
+        # Agent tracking data, stored as parallel lists indexed by each agent's row in self._agents
+        self._agents = {}          # Row index of each agent {name: index}
+        self._agent_ids = []       # Agent names, in registration order
+        self._parent = []          # Parent agent name, None for the manager
+        self._task = []            # Task assigned to the agent
+        self._task_display = []    # One-line task preview shown in the graph
+        self._status = []          # "idle", "active" or "completed"
+        self._steps = []           # Steps taken
+        self._tokens = []          # Input plus output tokens used
+        self._tool_calls = []      # Tool calls made
+        self._time_spent = []      # Seconds spent active
+        self._start_time = []      # When the agent last became active
+        self._layout = []          # Graph position from the tree layout (x, y, depth)
+        self._row_cache = []       # Metrics table row with its signature (signature, row)
+        self._node = []            # Graph node sent to the browser, patched in place
+        self._node_version = []    # Value of self._version when the node last changed
+        self._hidden = []          # Whether the agent is folded into its parent's cluster node
+        self._version = 0          # Bumped on every graph change, so sessions can diff by version
+        self._visible = []         # Rows of the agents drawn in the graph, in layout order
+        self._cluster_nodes = []   # Nodes standing in for the folded children of a parent
+        self._links = []           # Graph links {source, target} between drawn nodes
+        self._links_json = "[]"    # self._links serialized for the page head
+        self._topology_version = 0  # Value of self._version when the drawn nodes or links last changed
+        self._children = {}        # Children in registration order {parent_name: [child_name, ...]}
+        self._table_cache = None   # Last built metrics table rows
+        self._session_participants = set()  # Agents that became active during the current run
         
         # Initialize with the manager agent
         manager_name = getattr(agent, "name", None) or "manager"
@@ -35,66 +232,200 @@ class SuperGradioUI(GradioUI):
         
         # Try to discover managed agents from the manager
         if hasattr(agent, "managed_agents") and agent.managed_agents:
-            for agent_name, managed_agent in agent.managed_agents.items():
-                description = getattr(managed_agent, "description", "Sub-agent")
-                self.register_agent(agent_name, manager_name, description, "idle")
+            self._bulk_register([
+                (agent_name, manager_name, getattr(managed_agent, "description", "Sub-agent"), "idle")
+                for agent_name, managed_agent in agent.managed_agents.items()
+            ])
 
     def register_agent(self, agent_id: str, parent_id: str | None, 
                       description: str, status: str = "idle"):
-        """Register a new agent in the hierarchy"""
-        self.agent_hierarchy[agent_id] = parent_id
-        self.agent_tasks[agent_id] = description
-        self.agent_statuses[agent_id] = status
-        self.agent_metrics[agent_id] = {
-            "steps": 0,
-            "tokens": 0,
-            "tool_calls": 0,
-            "time_spent": 0
-        }
+        """Register a new agent in the hierarchy; agents that are already registered are left unchanged"""
+        self._bulk_register([(agent_id, parent_id, description, status)])
+
+    def _bulk_register(self, entries):
+        """Register several (agent_id, parent_id, description, status) entries, appending one row per new agent"""
+        for agent_id, parent_id, description, status in entries:
+            # Registering a known agent again must not reset its metrics
+            if agent_id in self._agents:
+                continue
+            
+            task_display = _task_preview(description)
+            node = {
+                "id": agent_id,
+                "name": agent_id,
+                "status": status,
+                "color": _STATUS_COLORS.get(status, "#9E9E9E"),
+                "task": task_display,
+                "steps": 0,
+                "tokens": 0,
+                "tool_calls": 0,
+                "time_spent": "0.00s",
+                "is_manager": parent_id is None,
+                "fx": None,
+                "fy": None
+            }
+            self._version += 1
+            row = (parent_id, description, task_display, status, 0, 0, 0, 0.0, None, None, None, node, self._version, False)
+            self._agents[agent_id] = len(self._agent_ids)
+            self._agent_ids.append(agent_id)
+            for column, value in zip(self._columns(), row):
+                column.append(value)
+            self._children.setdefault(parent_id, []).append(agent_id)
+        
+        for parent_id in {parent_id for _, parent_id, _, _ in entries}:
+            self._fold(parent_id)
+        self._relayout()
+
+    def _fold(self, parent_id) -> bool:
+        """Hide the non-active children of a parent with more than MAX_RENDERED_NODES children.
+
+        Returns True if any child was hidden or shown again.
+        """
+        children = self._children.get(parent_id, ())
+        fold = parent_id in self._agents and len(children) > MAX_RENDERED_NODES
+        changed = False
+        for child_id in children:
+            i = self._agents[child_id]
+            hidden = fold and self._status[i] != "active"
+            if self._hidden[i] != hidden:
+                self._hidden[i] = hidden
+                changed = True
+        return changed
+
+    def _relayout(self):
+        """Lay the drawn tree out tidily and rebuild the drawn nodes and links.
+
+        Columns are set by depth and leaves take consecutive rows, with each parent centred on its
+        children. Folded children are replaced by one cluster node, placed after their siblings.
+        """
+        next_row = 0
+        visible = []
+        cluster_nodes = []
+        links = []
+        
+        def place(agent_id, depth):
+            nonlocal next_row
+            i = self._agents[agent_id]
+            visible.append(i)
+            x = 120 + depth * 180
+            
+            children = self._children.get(agent_id, ())
+            shown = [child_id for child_id in children if not self._hidden[self._agents[child_id]]]
+            rows = [place(child_id, depth + 1) for child_id in shown]
+            links.extend({"source": agent_id, "target": child_id} for child_id in shown)
+            
+            folded = len(children) - len(shown)
+            if folded:
+                cluster_y = 60 + next_row * 80
+                next_row += 1
+                cluster_id = f"{agent_id}/others"
+                cluster_nodes.append({
+                    "id": cluster_id,
+                    "name": f"+{folded}",
+                    "status": "idle",
+                    "color": "#9E9E9E",
+                    "task": f"{folded} agents not currently active",
+                    "steps": 0,
+                    "tokens": 0,
+                    "tool_calls": 0,
+                    "time_spent": "0.00s",
+                    "is_manager": False,
+                    "fx": x + 180,
+                    "fy": cluster_y
+                })
+                links.append({"source": agent_id, "target": cluster_id})
+                rows.append(cluster_y)
+            
+            if rows:
+                y = (rows[0] + rows[-1]) // 2
+            else:
+                y = 60 + next_row * 80
+                next_row += 1
+            self._layout[i] = (x, y, depth)
+            if self._node[i]["fx"] != x or self._node[i]["fy"] != y:
+                self._patch_node(i, fx=x, fy=y)
+            return y
+        
+        # Agents whose parent is not registered are laid out as roots
+        for i, agent_id in enumerate(self._agent_ids):
+            if self._parent[i] not in self._agents:
+                place(agent_id, 0)
+        
+        self._visible = visible
+        self._cluster_nodes = cluster_nodes
+        self._links = links
+        # Keep "</" out of the inline script so a task string cannot close the tag
+        self._links_json = json.dumps(links, separators=(',', ':'), ensure_ascii=False).replace("</", "<\\/")
+        self._version += 1
+        self._topology_version = self._version
+
+    def _columns(self):
+        """The per-agent lists, in the order _bulk_register builds a row"""
+        return (
+            self._parent, self._task, self._task_display, self._status, self._steps, self._tokens,
+            self._tool_calls, self._time_spent, self._start_time, self._layout, self._row_cache,
+            self._node, self._node_version, self._hidden,
+        )
+
+    def _patch_node(self, i: int, **fields):
+        """Update fields of the graph node at row i and mark it as changed"""
+        self._version += 1
+        self._node[i].update(fields)
+        self._node_version[i] = self._version
         
     def update_agent_status(self, agent_id: str, status: str, task: str = None):
         """Update the status of an agent"""
-        if agent_id in self.agent_statuses:
-            old_status = self.agent_statuses[agent_id]
-            self.agent_statuses[agent_id] = status
+        i = self._agents.get(agent_id)
+        if i is not None:
+            old_status = self._status[i]
+            self._status[i] = status
             
             # Track timing when agent becomes active or completes
             if status == "active" and old_status != "active":
-                self.agent_start_times[agent_id] = time.time()
-            elif status == "completed" and old_status == "active" and agent_id in self.agent_start_times:
-                self.agent_metrics[agent_id]["time_spent"] += time.time() - self.agent_start_times[agent_id]
+                self._start_time[i] = time.time()
+            elif status == "completed" and old_status == "active" and self._start_time[i] is not None:
+                self._time_spent[i] += time.time() - self._start_time[i]
                 
             if task:
-                self.agent_tasks[agent_id] = task
+                self._task[i] = task
+                self._task_display[i] = _task_preview(task)
+            
+            # An agent of a large fleet joins or leaves its parent's cluster as it becomes active or inactive
+            if (status == "active") != (old_status == "active") and self._fold(self._parent[i]):
+                self._relayout()
+            
+            self._patch_node(
+                i,
+                status=status,
+                color=_STATUS_COLORS.get(status, "#9E9E9E"),
+                task=self._task_display[i],
+                time_spent=f"{self._time_spent[i]:.2f}s",
+            )
 
     def update_agent_metrics(self, agent_id: str, step_log: ActionStep):
         """Update metrics for an agent based on a step log"""
-        if agent_id in self.agent_metrics:
+        i = self._agents.get(agent_id)
+        if i is not None:
             # Increment steps
-            self.agent_metrics[agent_id]["steps"] += 1
+            self._steps[i] += 1
             
             # Count tokens if available
-            if hasattr(step_log, "input_token_count") and step_log.input_token_count:
-                self.agent_metrics[agent_id]["tokens"] += step_log.input_token_count
-            if hasattr(step_log, "output_token_count") and step_log.output_token_count:
-                self.agent_metrics[agent_id]["tokens"] += step_log.output_token_count
+            self._tokens[i] += (getattr(step_log, "input_token_count", 0) or 0) + (getattr(step_log, "output_token_count", 0) or 0)
                 
             # Count tool calls
-            if hasattr(step_log, "tool_calls") and step_log.tool_calls:
-                self.agent_metrics[agent_id]["tool_calls"] += len(step_log.tool_calls)
-
-    def track_agent_creation(self, step_log: ActionStep):
-        """Track agent creation and calls from steps"""
-        # Figure out which agent is active
-        active_agent = None
-        for agent_id, status in self.agent_statuses.items():
-            if status == "active":
-                active_agent = agent_id
-                break
-        
-        # Update metrics for the active agent
-        if active_agent:
-            self.update_agent_metrics(active_agent, step_log)
+            tool_calls = getattr(step_log, "tool_calls", None)
+            if tool_calls:
+                self._tool_calls[i] += len(tool_calls)
+            
+            self._patch_node(i, steps=self._steps[i], tokens=self._tokens[i], tool_calls=self._tool_calls[i])
+
+    def track_agent_creation(self, step_log: ActionStep, owner_id: str):
+        """Track agent creation and calls from steps.
+
+        Metrics go only to owner_id, the agent whose run streamed the step; agents it calls are
+        marked active for the graph, but their own steps are not streamed here.
+        """
+        self.update_agent_metrics(owner_id, step_log)
         
         # Only process if step_log has model_output
         if not hasattr(step_log, "model_output") or not step_log.model_output:
@@ -103,293 +434,191 @@ class SuperGradioUI(GradioUI):
         # Try to detect if a managed agent is being called
         model_output = step_log.model_output
         
-        # Method 1: Look for Python code calling managed agents
-        if ".run(" in model_output:
+        # Method 1: Look for Python code calling managed agents, skipping the regex when no known agent is mentioned
+        if ".run(" in model_output and any(name in model_output for name in self._agent_ids):
             # Extract agent name from code like: search_agent.run("query")
-            import re
-            agent_calls = re.findall(r'(\w+)\.run\([\'"]([^\'"]+)[\'"]', model_output)
-            for agent_name, task in agent_calls:
-                if agent_name in self.agent_hierarchy:
+            for match in _AGENT_CALL_RE.finditer(model_output):
+                agent_name, task = match.groups()
+                if agent_name in self._agents:
                     self.update_agent_status(agent_name, "active", task)
+                    self._session_participants.add(agent_name)
         
         # Method 2: Look for tool calls that might be managed agent calls
         if hasattr(step_log, "tool_calls") and step_log.tool_calls:
             for tool_call in step_log.tool_calls:
                 # Check if tool name matches a known agent
-                if tool_call.name in self.agent_hierarchy:
+                if tool_call.name in self._agents:
                     args = tool_call.arguments
                     task = args if isinstance(args, str) else str(args)
                     self.update_agent_status(tool_call.name, "active", task)
+                    self._session_participants.add(tool_call.name)
 
-    def generate_html_visualization(self):
-        """Generate an HTML visualization of the agent hierarchy with D3.js"""
-        # Create nodes and links for our agent hierarchy
-        nodes = []
-        links = []
-        
-        # Create a node for each agent
-        for agent_id in self.agent_hierarchy:
-            status = self.agent_statuses.get(agent_id, "unknown")
-            color = "#4CAF50" if status == "active" else "#8BC34A" if status == "completed" else "#9E9E9E"  # Green, light green, gray
-            task = self.agent_tasks.get(agent_id, "No task assigned")
-            metrics = self.agent_metrics.get(agent_id, {})
-            
-            # Check if this is the manager
-            is_manager = self.agent_hierarchy[agent_id] is None
-            
-            nodes.append({
-                "id": agent_id,
-                "name": agent_id,
-                "status": status,
-                "color": color,
-                "task": task[:50] + "..." if len(task) > 50 else task,
-                "steps": metrics.get("steps", 0),
-                "tokens": metrics.get("tokens", 0),
-                "tool_calls": metrics.get("tool_calls", 0),
-                "time_spent": f"{metrics.get('time_spent', 0):.2f}s",
-                "is_manager": is_manager
-            })
-        
-        # Create links between agents
-        for agent_id, parent_id in self.agent_hierarchy.items():
-            if parent_id is not None:
-                links.append({
-                    "source": parent_id,
-                    "target": agent_id
-                })
+    def _diff_payload(self, session_state, full: bool = False):
+        """Return the graph changes since the last payload sent to this session, or None if nothing changed.
+
+        The first payload of a session (or any payload with full=True) resets the client graph
+        with every drawn node and link, as does any payload after the drawn nodes or links changed;
+        the others only carry the nodes whose fields changed.
+        """
+        last_version = None if full else session_state.get("viz_version")
+        session_state["viz_version"] = self._version
         
-        # Convert nodes and links to JSON strings for embedding in JavaScript
-        nodes_json = json.dumps(nodes)
-        links_json = json.dumps(links)
+        # Nodes are copied because the originals keep being patched while the payload is sent.
+        # The drawn set is bounded by clustering, so a topology change simply resets the graph.
+        if last_version is None or self._topology_version > last_version:
+            return {"reset": True, "nodes": self._drawn_nodes(), "links": list(self._links)}
         
-        # Create the HTML for the visualization
-        html = f"""
-        <div id="agent-visualization" style="width: 100%; height: 400px; border: 1px solid #ccc; border-radius: 8px; overflow: hidden;"></div>
-        <script src="https://d3js.org/d3.v7.min.js"></script>
-        <script>
-        (function() {{
-            // Clear any existing visualization
-            d3.select("#agent-visualization").html("");
-            
-            // Data for the visualization
-            const nodes = {nodes_json};
-            const links = {links_json};
-            
-            // Get the container dimensions
-            const container = d3.select("#agent-visualization");
-            const width = container.node().getBoundingClientRect().width;
-            const height = container.node().getBoundingClientRect().height;
-            
-            // Create the SVG
-            const svg = container.append("svg")
-                .attr("width", width)
-                .attr("height", height)
-                .attr("viewBox", [0, 0, width, height]);
-                
-            // Create a group for everything
-            const g = svg.append("g");
-            
-            // Create the simulation
-            const simulation = d3.forceSimulation(nodes)
-                .force("link", d3.forceLink(links).id(function(d) {{ return d.id; }}).distance(100))
-                .force("charge", d3.forceManyBody().strength(-300))
-                .force("center", d3.forceCenter(width / 2, height / 2))
-                .on("tick", ticked);
-            
-            // Create the links
-            const link = g.append("g")
-                .selectAll("line")
-                .data(links)
-                .join("line")
-                .attr("stroke", "#999")
-                .attr("stroke-opacity", 0.6)
-                .attr("stroke-width", 2);
-            
-            // Create the nodes
-            const node = g.append("g")
-                .selectAll("g")
-                .data(nodes)
-                .join("g")
-                .call(drag(simulation));
-            
-            // Add circles for nodes
-            node.append("circle")
-                .attr("r", function(d) {{ return d.is_manager ? 30 : 25; }})
-                .attr("fill", function(d) {{ return d.color; }})
-                .attr("stroke", "#fff")
-                .attr("stroke-width", 2);
-            
-            // Add text labels
-            node.append("text")
-                .attr("text-anchor", "middle")
-                .attr("dy", ".3em")
-                .attr("fill", "white")
-                .attr("font-weight", "bold")
-                .text(function(d) {{ return d.name; }});
-            
-            // Add tooltips
-            node.append("title")
-                .text(function(d) {{ 
-                    return "Agent: " + d.name + 
-                           "\\nStatus: " + d.status + 
-                           "\\nTask: " + d.task + 
-                           "\\nSteps: " + d.steps + 
-                           "\\nTokens: " + d.tokens + 
-                           "\\nTool Calls: " + d.tool_calls + 
-                           "\\nTime: " + d.time_spent;
-                }});
-            
-            // Update positions on each tick
-            function ticked() {{
-                link
-                    .attr("x1", function(d) {{ return d.source.x; }})
-                    .attr("y1", function(d) {{ return d.source.y; }})
-                    .attr("x2", function(d) {{ return d.target.x; }})
-                    .attr("y2", function(d) {{ return d.target.y; }});
-                
-                node.attr("transform", function(d) {{ return "translate(" + d.x + "," + d.y + ")"; }});
-            }}
-            
-            // Drag behavior
-            function drag(simulation) {{
-                function dragstarted(event) {{
-                    if (!event.active) simulation.alphaTarget(0.3).restart();
-                    event.subject.fx = event.subject.x;
-                    event.subject.fy = event.subject.y;
-                }}
-                
-                function dragged(event) {{
-                    event.subject.fx = event.x;
-                    event.subject.fy = event.y;
-                }}
-                
-                function dragended(event) {{
-                    if (!event.active) simulation.alphaTarget(0);
-                    event.subject.fx = null;
-                    event.subject.fy = null;
-                }}
-                
-                return d3.drag()
-                    .on("start", dragstarted)
-                    .on("drag", dragged)
-                    .on("end", dragended);
-            }}
-            
-            // Add zoom capabilities
-            const zoom = d3.zoom()
-                .on("zoom", function(event) {{
-                    g.attr("transform", event.transform);
-                }});
-            
-            svg.call(zoom);
-        }})();
-        </script>
+        nodes = [dict(self._node[i]) for i in self._visible if self._node_version[i] > last_version]
+        return {"nodes": nodes} if nodes else None
+
+    def _drawn_nodes(self):
+        """Return copies of the nodes drawn in the graph, including cluster nodes"""
+        return [dict(self._node[i]) for i in self._visible] + [dict(node) for node in self._cluster_nodes]
+
+    def _graph_update(self, session_state):
+        """Wrap the next graph payload as an update for the hidden patch component"""
+        payload = self._diff_payload(session_state)
+        return gr.update() if payload is None else gr.update(value=payload)
+
+    def _metrics_update(self, session_state):
+        """Return the metrics rows, or a no-op update if this session already received these rows"""
+        rows = self._metrics_rows()
+        if rows is session_state.get("last_metrics_rows"):
+            return gr.update()
+        session_state["last_metrics_rows"] = rows
+        return rows
+
+    def _viz_updates(self, session_state, final: bool = False):
+        """Return the graph and metrics updates, or no-op updates if the last ones went out too recently.
+
+        Only the tab the user is looking at is rebuilt; the other one catches up when it is selected.
+        Skipped changes are not lost: the next graph payload is diffed against the last one sent.
         """
+        now = time.monotonic()
+        if not final and now - session_state.get("last_viz_emit", 0.0) < VIZ_MIN_INTERVAL:
+            return gr.update(), gr.update()
+        session_state["last_viz_emit"] = now
+        if session_state.get("active_tab", "network") == "metrics":
+            return gr.update(), self._metrics_update(session_state)
+        return self._graph_update(session_state), gr.update()
+
+    def select_tab(self, tab: str, session_state):
+        """Remember which visualization tab is open and bring it up to date"""
+        session_state["active_tab"] = tab
+        if tab == "metrics":
+            return gr.update(), self._metrics_update(session_state)
+        return self._graph_update(session_state), gr.update()
+
+    def _render_shell(self):
+        """Build the <head> markup that loads D3 and installs window.updateAgentGraph.
+
+        The graph is drawn once and then patched in place: updateAgentGraph merges node changes
+        and places nodes at the fixed positions computed in register_agent.
+        """
+        # Keep "</" out of the inline script so a task string cannot close the tag
+        nodes_json = json.dumps(self._drawn_nodes(), separators=(',', ':'), ensure_ascii=False).replace("</", "<\\/")
         
-        return html
+        return _VIZ_TEMPLATE.substitute(nodes_json=nodes_json, links_json=self._links_json)
 
-    def generate_metrics_table(self):
-        """Generate an HTML table with agent metrics"""
+    def _metrics_rows(self):
+        """Build the agent metrics table rows; returns the previous list object when nothing changed"""
         rows = []
+        changed = False
         
-        # Create a row for each agent
-        for agent_id in self.agent_hierarchy:
-            status = self.agent_statuses.get(agent_id, "unknown")
-            status_emoji = "🟢" if status == "active" else "✅" if status == "completed" else "⏸️"
-            metrics = self.agent_metrics.get(agent_id, {})
+        # Create a row for each agent, reusing the cached row of agents whose values did not change
+        for i, agent_id in enumerate(self._agent_ids):
+            status = self._status[i]
+            signature = (status, self._steps[i], self._tokens[i], self._tool_calls[i], round(self._time_spent[i], 2))
+            cached = self._row_cache[i]
+            if cached is not None and cached[0] == signature:
+                rows.append(cached[1])
+                continue
             
-            rows.append(f"""
-            <tr>
-                <td>{status_emoji} {agent_id}</td>
-                <td>{status}</td>
-                <td>{metrics.get('steps', 0)}</td>
-                <td>{metrics.get('tokens', 0)}</td>
-                <td>{metrics.get('tool_calls', 0)}</td>
-                <td>{metrics.get('time_spent', 0):.2f}s</td>
-            </tr>
-            """)
+            changed = True
+            status_emoji = "🟢" if status == "active" else "✅" if status == "completed" else "⏸️"
+            row = [f"{status_emoji} {agent_id}", status, signature[1], signature[2], signature[3], f"{signature[4]:.2f}s"]
+            self._row_cache[i] = (signature, row)
+            rows.append(row)
         
-        table = f"""
-        <div style="margin-top: 10px; margin-bottom: 10px;">
-            <h3>Agent Metrics</h3>
-            <table style="width: 100%; border-collapse: collapse; margin-top: 10px;">
-                <thead>
-                    <tr>
-                        <th style="border: 1px solid #ddd; padding: 8px; text-align: left;">Agent</th>
-                        <th style="border: 1px solid #ddd; padding: 8px; text-align: left;">Status</th>
-                        <th style="border: 1px solid #ddd; padding: 8px; text-align: left;">Steps</th>
-                        <th style="border: 1px solid #ddd; padding: 8px; text-align: left;">Tokens</th>
-                        <th style="border: 1px solid #ddd; padding: 8px; text-align: left;">Tool Calls</th>
-                        <th style="border: 1px solid #ddd; padding: 8px; text-align: left;">Time Spent</th>
-                    </tr>
-                </thead>
-                <tbody>
-                    {"".join(rows)}
-                </tbody>
-            </table>
-        </div>
-        """
+        # Nothing changed and no agent was added or removed since the last table
+        if not changed and self._table_cache is not None and len(self._table_cache) == len(rows):
+            return self._table_cache
         
-        return table
+        self._table_cache = rows
+        return rows
 
-    def interact_with_agent(self, prompt, messages, session_state, agent_viz_html, agent_metrics_html):
-        """Override the interaction method to update the visualization"""
+    async def interact_with_agent(self, prompt, messages, session_state, agent_metrics):
+        """Override the interaction method to update the visualization.
+
+        The agent's steps are pulled in a worker thread, and the next step is already running
+        while the current one is rendered and sent to the browser.
+        """
         # Get the agent from the session state or use the default one
         if "agent" not in session_state:
             session_state["agent"] = self.agent
 
+        steps = next_step = None
         try:
             # Add the user's message to the chat
             messages.append(gr.ChatMessage(role="user", content=prompt))
             
-            # Update the manager agent's status and task
+            # Update the manager agent's status and task; it is the first participant of this run
             manager_name = getattr(session_state["agent"], "name", None) or "manager"
+            self._session_participants = {manager_name}
             self.update_agent_status(manager_name, "active", prompt)
             
             # Update the visualization immediately
-            current_viz_html = self.generate_html_visualization()
-            current_metrics_html = self.generate_metrics_table()
-            
-            yield messages, current_viz_html, current_metrics_html
-
-            # Track the start time of the entire session
-            session_start = time.time()
+            yield messages, *self._viz_updates(session_state, final=True)
 
-            # Process the agent's run
-            for step_log in session_state["agent"].run(prompt, stream=True):
+            # Process the agent's run, starting each step before handling the previous one
+            steps = session_state["agent"].run(prompt, stream=True)
+            next_step = asyncio.ensure_future(asyncio.to_thread(next, steps, _RUN_DONE))
+            # Shielded so a disconnect cancels only the wait, not the step in the worker thread
+            while (step_log := await asyncio.shield(next_step)) is not _RUN_DONE:
+                next_step = asyncio.ensure_future(asyncio.to_thread(next, steps, _RUN_DONE))
+                
+                # Collect all messages from the step so the chat is updated once per step
+                new_msgs = list(pull_messages_from_step(step_log))
+                messages.extend(new_msgs)
+                
                 # Track agent activity if this is an action step
                 if isinstance(step_log, ActionStep):
-                    self.track_agent_creation(step_log)
+                    self.track_agent_creation(step_log, manager_name)
                     
-                    # Update the visualization after tracking
-                    current_viz_html = self.generate_html_visualization()
-                    current_metrics_html = self.generate_metrics_table()
-                    yield messages, current_viz_html, current_metrics_html
-                
-                # Process messages from the step
-                for message in pull_messages_from_step(step_log):
-                    messages.append(message)
-                    yield messages, current_viz_html, current_metrics_html
+                    # Update the visualization after tracking, unless it was updated very recently
+                    yield messages, *self._viz_updates(session_state)
+                elif new_msgs:
+                    # The graph has not changed since the last update
+                    yield messages, gr.update(), gr.update()
 
-            # Mark the manager agent as completed
-            self.update_agent_status(manager_name, "completed")
-            
-            # Update the time spent for the whole session
-            session_time = time.time() - session_start
-            for agent_id in self.agent_hierarchy:
-                if self.agent_statuses.get(agent_id) != "idle" and self.agent_metrics[agent_id]["time_spent"] == 0:
-                    # If no time was tracked but agent was used, assign a proportion of the session time
-                    self.agent_metrics[agent_id]["time_spent"] = session_time * 0.8 if agent_id == manager_name else session_time * 0.2
+            self._finish_session_participants()
             
-            # Final visualization update
-            current_viz_html = self.generate_html_visualization()
-            current_metrics_html = self.generate_metrics_table()
-            yield messages, current_viz_html, current_metrics_html
+            # Final visualization update, always sent so skipped changes are flushed
+            yield messages, *self._viz_updates(session_state, final=True)
             
         except Exception as e:
             print(f"Error in interaction: {str(e)}")
             messages.append(gr.ChatMessage(role="assistant", content=f"Error: {str(e)}"))
-            yield messages, agent_viz_html, agent_metrics_html
+            yield messages, gr.update(), agent_metrics
+        finally:
+            # The run may have failed or the client may have gone away mid-run. Let the step
+            # already running in the worker thread finish, since a generator cannot be closed
+            # while it is executing, then close the run and settle the agents it left active.
+            if next_step is not None and not next_step.done():
+                try:
+                    await next_step
+                except Exception:
+                    pass
+            if steps is not None:
+                steps.close()
+            self._finish_session_participants()
+
+    def _finish_session_participants(self):
+        """Mark the manager and every agent it called as completed, which adds the time each one
+        spent active since it was called. Agents that already finished are left alone."""
+        for agent_id in self._session_participants:
+            if self._status[self._agents[agent_id]] == "active":
+                self.update_agent_status(agent_id, "completed")
 
     def log_user_message(self, text_input, file_uploads_log):
         """Process user input and inform about file uploads"""
@@ -405,7 +634,8 @@ class SuperGradioUI(GradioUI):
         """Create and launch a custom Gradio interface with a persistent agent visualization"""
         import gradio as gr
 
-        with gr.Blocks(theme="soft") as demo:
+        # D3 and the graph renderer load once in <head>; scripts inside gr.HTML are never executed
+        with gr.Blocks(theme="soft", head=self._render_shell(), css="#agent-graph-patch { display: none !important; }") as demo:
             # Session state
             session_state = gr.State({})
             stored_messages = gr.State([])
@@ -443,11 +673,22 @@ class SuperGradioUI(GradioUI):
                 
                 # Right column for visualization
                 with gr.Column(scale=4):
+                    # The metrics table is filled in when its tab is first opened
                     with gr.Tabs():
-                        with gr.Tab("Agent Network"):
-                            agent_viz_html = gr.HTML(self.generate_html_visualization(), label="Agent Visualization")
-                        with gr.Tab("Agent Metrics"):
-                            agent_metrics_html = gr.HTML(self.generate_metrics_table(), label="Agent Metrics")
+                        with gr.Tab("Agent Network") as network_tab:
+                            gr.HTML(
+                                '<div id="agent-visualization" style="width: 100%; height: 400px; border: 1px solid #ccc; border-radius: 8px; overflow: hidden;"></div>',
+                                label="Agent Visualization",
+                            )
+                            # Carries graph patches to window.updateAgentGraph; hidden with CSS so its change event still fires
+                            graph_patch = gr.JSON(elem_id="agent-graph-patch")
+                        with gr.Tab("Agent Metrics") as metrics_tab:
+                            agent_metrics = gr.Dataframe(
+                                headers=["Agent", "Status", "Steps", "Tokens", "Tool Calls", "Time Spent"],
+                                datatype=["str", "str", "number", "number", "number", "str"],
+                                label="Agent Metrics",
+                                interactive=False,
+                            )
                     
                     # File upload section
                     if self.file_upload_folder is not None:
@@ -483,8 +724,8 @@ class SuperGradioUI(GradioUI):
                 [stored_messages, text_input, submit_btn],
             ).then(
                 self.interact_with_agent,
-                [stored_messages, chatbot, session_state, agent_viz_html, agent_metrics_html],
-                [chatbot, agent_viz_html, agent_metrics_html],
+                [stored_messages, chatbot, session_state, agent_metrics],
+                [chatbot, graph_patch, agent_metrics],
             ).then(
                 lambda: (
                     gr.Textbox(
@@ -503,8 +744,8 @@ class SuperGradioUI(GradioUI):
                 [stored_messages, text_input, submit_btn],
             ).then(
                 self.interact_with_agent,
-                [stored_messages, chatbot, session_state, agent_viz_html, agent_metrics_html],
-                [chatbot, agent_viz_html, agent_metrics_html],
+                [stored_messages, chatbot, session_state, agent_metrics],
+                [chatbot, graph_patch, agent_metrics],
             ).then(
                 lambda: (
                     gr.Textbox(
@@ -517,5 +758,13 @@ class SuperGradioUI(GradioUI):
                 [text_input, submit_btn],
             )
 
+            # Track the open tab in the session state, which a running interaction reads on every update
+            network_tab.select(lambda state: self.select_tab("network", state), [session_state], [graph_patch, agent_metrics])
+            metrics_tab.select(lambda state: self.select_tab("metrics", state), [session_state], [graph_patch, agent_metrics])
+
+            # Apply graph patches in the browser, and send each new page the current graph
+            graph_patch.change(None, [graph_patch], None, js="(patch) => { window.updateAgentGraph(patch); }")
+            demo.load(lambda state: self._diff_payload(state, full=True), [session_state], [graph_patch])
+
         # Launch the demo
         demo.launch(share=share, **kwargs)
\ No newline at end of file
@@ -0,0 +1,30 @@
+import threading
+
+from cachetools import TTLCache
+from smolagents import DuckDuckGoSearchTool
+
+# Shared by every instance so all agents in a process reuse each other's searches
+_SEARCH_CACHE = TTLCache(maxsize=512, ttl=3600)
+_SEARCH_CACHE_LOCK = threading.Lock()  # cachetools caches are not thread-safe
+
+
+class CachedDuckDuckGoSearchTool(DuckDuckGoSearchTool):
+    """
+    A drop-in DuckDuckGoSearchTool that answers repeated queries from an in-memory TTL cache.
+    Agents often re-issue the same search across steps; serving those from memory avoids
+    the network round-trip and DuckDuckGo's rate limiting.
+    """
+
+    def forward(self, query: str) -> str:
+        # Queries differing only in case or whitespace share an entry
+        key = (" ".join(query.split()).lower(), self.max_results)
+        with _SEARCH_CACHE_LOCK:
+            cached = _SEARCH_CACHE.get(key)
+        if cached is not None:
+            return cached
+
+        # Failed searches raise and are therefore never cached
+        results = super().forward(query)
+        with _SEARCH_CACHE_LOCK:
+            _SEARCH_CACHE[key] = results
+        return results
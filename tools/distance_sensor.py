@@ -1,8 +1,16 @@
 import asyncio
-import serial_asyncio
-from typing import Any, Dict, Optional
+import statistics
+import threading
+import time
+import serial
+from concurrent.futures import ThreadPoolExecutor
+from serial import SerialException
+from typing import Any, Dict, List, Optional, Tuple
 from smolagents.tools import Tool
 
+# Seconds to wait for a complete line of sensor data
+_READ_TIMEOUT = 5.0
+
 class SonarDistanceSensorTool(Tool):
     """
     A SmolaAgents tool for reading a distance measurement from the HC-SR04 Sonar Distance Sensor.
@@ -25,67 +33,229 @@ class SonarDistanceSensorTool(Tool):
             description = (
                 "Reads a distance measurement from the HC-SR04 sonar sensor. "
                 "Provide the serial port (e.g., '/dev/ttyUSB0' or 'COM3') "
-                "and optionally the baud rate (default is 115200)."
+                "and optionally the baud rate (default is 115200) and the number of "
+                "samples to take the median of (default is 1)."
             )
             
         super().__init__(name=name, description=description)
+        
+        # Open serial ports reused across readings {(port, baud): (serial, lock, buffer)}
+        self._conns: Dict[Tuple[str, int], Tuple[serial.Serial, threading.Lock, bytearray]] = {}
+        self._conns_lock = threading.Lock()
+        # Readings awaited through _async_read_sensor run here, so the caller's event loop is not blocked
+        self._executor = ThreadPoolExecutor(thread_name_prefix=f"{name}-serial")
+        # Last single-line reading and its answer (raw line, answer); a still sensor repeats itself
+        self._last_reading: Optional[Tuple[bytes, str]] = None
     
-    def _run(self, port: str, baud: int = 115200) -> str:
+    def _run(self, port: str, baud: int = 115200, samples: int = 1) -> str:
         """
-        Connects to the sensor over the provided serial port and reads one line of data.
+        Connects to the sensor over the provided serial port and reads one or more lines of data.
         
         Args:
             port: The serial port for the sensor (e.g., '/dev/ttyUSB0' on Linux or 'COM3' on Windows)
             baud: The baud rate for the serial connection (default: 115200)
+            samples: The number of readings to take the median of (default: 1)
             
         Returns:
             The sensor reading as a string
         """
         try:
-            # Run the async function using asyncio
-            return asyncio.run(self._async_read_sensor(port, baud))
+            # pyserial is blocking, so a direct call is the fastest path
+            return self._read_sensor(port, baud, samples)
         except Exception as e:
             return f"Error reading from sensor: {str(e)}"
     
-    async def _async_read_sensor(self, port: str, baud: int = 115200) -> str:
+    async def _async_read_sensor(self, port: str, baud: int = 115200, samples: int = 1) -> str:
+        """
+        Asynchronous function to read from the sensor, for callers that await other I/O at the same time.
+        
+        Args:
+            port: The serial port for the sensor
+            baud: The baud rate for the serial connection
+            samples: The number of readings to take the median of
+            
+        Returns:
+            The sensor reading as a string
         """
-        Asynchronous function to read from the sensor.
+        return await asyncio.get_running_loop().run_in_executor(
+            self._executor, self._read_sensor, port, baud, samples
+        )
+
+    def _read_sensor(self, port: str, baud: int = 115200, samples: int = 1) -> str:
+        """
+        Read from the sensor over the cached connection. Blocks for up to 5 seconds.
         
         Args:
             port: The serial port for the sensor
             baud: The baud rate for the serial connection
+            samples: The number of readings to take the median of
             
         Returns:
             The sensor reading as a string
         """
         try:
-            # Open an asynchronous serial connection using pyserial-asyncio
-            reader, writer = await serial_asyncio.open_serial_connection(url=port, baudrate=baud)
+            ser, lock, buffer = self._get_connection(port, baud)
         except Exception as e:
             return f"Error opening serial port: {str(e)}"
 
-        try:
-            # Wait up to 5 seconds for a line of sensor data
+        # Concurrent readings on the same port take turns instead of opening it again
+        with lock:
+            # Wait up to 5 seconds for the lines of sensor data
             try:
-                line = await asyncio.wait_for(reader.readline(), timeout=5.0)
-            except asyncio.TimeoutError:
+                lines = self._read_latest_lines(ser, buffer, max(1, samples))
+            except TimeoutError:
                 return "Timeout while reading from sensor."
+            except (OSError, SerialException) as e:
+                # The port went away; drop the connection so the next reading reopens it
+                self._close_connection((port, baud))
+                return f"Error reading from sensor: {str(e)}"
 
-            # Decode the line (assuming UTF-8 encoding)
-            reading = line.decode("utf-8", errors="replace").strip()
+        if len(lines) != 1:
+            return self._format_readings(lines)
+        
+        # The answer depends only on the line, so a repeated line reuses the previous answer
+        last = self._last_reading
+        if last is not None and last[0] == lines[0]:
+            return last[1]
+        answer = self._format_readings(lines)
+        self._last_reading = (lines[0], answer)
+        return answer
+
+    @staticmethod
+    def _format_readings(lines: List[bytes]) -> str:
+        """
+        Turn the lines read from the sensor into the tool's answer.
+        
+        Args:
+            lines: The sensor lines without their newlines
             
-            # Try to parse the reading as a number if possible
+        Returns:
+            The distance, the median distance of several lines, or the raw reading if it is not a number
+        """
+        # float() parses ASCII bytes directly and ignores surrounding whitespace, so numeric
+        # lines are never decoded; only a non-numeric line is decoded for display
+        if len(lines) == 1:
             try:
-                distance_cm = float(reading)
+                distance_cm = float(lines[0])
                 return f"Distance: {distance_cm} cm"
             except ValueError:
-                # If it can't be parsed as a number, return the raw reading
-                return f"Sensor reading: {reading}"
-                
-        finally:
-            # Always close the writer to clean up resources
-            writer.close()
-            await writer.wait_closed()
+                # If it can't be parsed as a number, return the raw reading (assuming UTF-8 encoding)
+                return f"Sensor reading: {lines[0].decode('utf-8', errors='replace').strip()}"
+        
+        # Take the median of the numeric readings, which ignores occasional echo glitches
+        distances = []
+        for line in lines:
+            try:
+                distances.append(float(line))
+            except ValueError:
+                pass
+        if not distances:
+            return f"Sensor reading: {lines[-1].decode('utf-8', errors='replace').strip()}"
+        return f"Distance: {statistics.median(distances)} cm (median of {len(distances)} readings)"
+
+    def _get_connection(self, port: str, baud: int):
+        """
+        Return the cached connection for a port and baud rate, opening it if needed.
+        
+        Args:
+            port: The serial port for the sensor
+            baud: The baud rate for the serial connection
+            
+        Returns:
+            A (serial, lock, buffer) tuple
+        """
+        key = (port, baud)
+        with self._conns_lock:
+            conn = self._conns.get(key)
+            if conn is None or not conn[0].is_open:
+                conn = self._conns[key] = (self._open_serial(port, baud), threading.Lock(), bytearray())
+            return conn
+
+    @staticmethod
+    def _open_serial(port: str, baud: int) -> serial.Serial:
+        """
+        Open a serial port, asking the driver for low latency where it supports it.
+        
+        Args:
+            port: The serial port for the sensor
+            baud: The baud rate for the serial connection
+            
+        Returns:
+            The open pyserial port
+        """
+        ser = serial.Serial(port, baud, timeout=_READ_TIMEOUT)
+        # Linux only: sets ASYNC_LOW_LATENCY so the driver delivers bytes without batching them
+        set_low_latency_mode = getattr(ser, "set_low_latency_mode", None)
+        if set_low_latency_mode is not None:
+            try:
+                set_low_latency_mode(True)
+            except (NotImplementedError, ValueError, OSError):
+                pass
+        return ser
+
+    @staticmethod
+    def _read_latest_lines(ser: serial.Serial, buffer: bytearray, count: int = 1) -> List[bytes]:
+        """
+        Return the most recent complete lines from the sensor. Blocks for up to 5 seconds.
+        
+        Reads everything the driver has buffered in one call and finds line ends with rfind,
+        instead of scanning for each newline with readline. Older lines that piled up since
+        the last reading are skipped, and a trailing partial line is kept for the next call.
+        
+        Args:
+            ser: The open serial port
+            buffer: Bytes received after the last complete line
+            count: The number of lines to return
+            
+        Returns:
+            The newest count lines, oldest first, without their newlines; fewer if the
+            sensor fell silent before count lines arrived
+            
+        Raises:
+            TimeoutError: If no complete line arrived within 5 seconds
+        """
+        deadline = time.monotonic() + _READ_TIMEOUT
+        lines: List[bytes] = []
+        while True:
+            # Returns as soon as one byte arrives, or empty after the port timeout
+            buffer += ser.read(ser.in_waiting or 1)
+            end = buffer.rfind(b"\n")
+            if end != -1:
+                if count == 1:
+                    # Common case: only the newest line is needed, so skip splitting the rest
+                    start = buffer.rfind(b"\n", 0, end) + 1
+                    lines = [bytes(buffer[start:end])]
+                else:
+                    lines = (lines + bytes(buffer[:end]).split(b"\n"))[-count:]
+                del buffer[:end + 1]
+                if len(lines) == count:
+                    return lines
+            if time.monotonic() >= deadline:
+                # Settle for fewer samples rather than dropping the ones already read
+                if lines:
+                    return lines
+                raise TimeoutError("No complete line from sensor")
+
+    def _close_connection(self, key: Tuple[str, int]):
+        """Close and forget one cached connection."""
+        with self._conns_lock:
+            conn = self._conns.pop(key, None)
+        if conn is not None:
+            try:
+                conn[0].close()
+            except Exception:
+                pass
+
+    def close(self):
+        """Close every cached serial connection and stop the reader threads. Call this when the
+        tool is no longer needed."""
+        for key in list(self._conns):
+            self._close_connection(key)
+        self._executor.shutdown(wait=False)
+
+    async def aclose(self):
+        """Asynchronous variant of close()."""
+        self.close()
 
 
 # Example usage
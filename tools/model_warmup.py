@@ -0,0 +1,17 @@
+import logging
+import threading
+
+logger = logging.getLogger("dharmagents")
+
+
+def warm_up_model(model):
+    """Send a one-token request in the background so the first real step hits a warm endpoint."""
+    def ping():
+        try:
+            model([{"role": "user", "content": [{"type": "text", "text": "ping"}]}], max_tokens=1)
+        except Exception as e:
+            logger.warning(f"Model warm-up failed: {str(e)}")
+
+    thread = threading.Thread(target=ping, daemon=True)
+    thread.start()
+    return thread
@@ -5,7 +5,7 @@ from langchain_core.messages import HumanMessage
 
 from dotenv import load_dotenv
 
-from create_agent import create_agent
+from create_agent import create_agent, tool_cache_turn
 
 """
 AgentKit Chatbot Interface
@@ -47,14 +47,15 @@ def run_autonomous_mode(agent_executor, config, interval=10):
             )
 
             # Run agent in autonomous mode
-            for chunk in agent_executor.stream(
-                {"messages": [HumanMessage(content=thought)]}, config
-            ):
-                if "agent" in chunk:
-                    print(chunk["agent"]["messages"][0].content)
-                elif "tools" in chunk:
-                    print(chunk["tools"]["messages"][0].content)
-                print("-------------------")
+            with tool_cache_turn():
+                for chunk in agent_executor.stream(
+                    {"messages": [HumanMessage(content=thought)]}, config
+                ):
+                    if "agent" in chunk:
+                        print(chunk["agent"]["messages"][0].content)
+                    elif "tools" in chunk:
+                        print(chunk["tools"]["messages"][0].content)
+                    print("-------------------")
 
             # Wait before the next action
             time.sleep(interval)
@@ -75,14 +76,15 @@ def run_chat_mode(agent_executor, config):
                 break
 
             # Run agent with the user's input in chat mode
-            for chunk in agent_executor.stream(
-                {"messages": [HumanMessage(content=user_input)]}, config
-            ):
-                if "agent" in chunk:
-                    print(chunk["agent"]["messages"][0].content)
-                elif "tools" in chunk:
-                    print(chunk["tools"]["messages"][0].content)
-                print("-------------------")
+            with tool_cache_turn():
+                for chunk in agent_executor.stream(
+                    {"messages": [HumanMessage(content=user_input)]}, config
+                ):
+                    if "agent" in chunk:
+                        print(chunk["agent"]["messages"][0].content)
+                    elif "tools" in chunk:
+                        print(chunk["tools"]["messages"][0].content)
+                    print("-------------------")
 
         except KeyboardInterrupt:
             print("Goodbye Agent!")
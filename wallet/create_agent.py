@@ -1,3 +1,10 @@
+import json
+import functools
+import threading
+import contextlib
+import contextvars
+import warnings
+
 from langchain_openai import ChatOpenAI
 from langgraph.checkpoint.memory import MemorySaver
 from langgraph.prebuilt import create_react_agent
@@ -38,8 +45,113 @@ AGENT_INSTRUCTIONS = (
     "responses. Refrain from restating your tools' descriptions unless it is explicitly requested."
 )
 
+# AgentKit actions that only read chain state, as (action provider class, action method) pairs;
+# repeated identical calls within one turn reuse the result. AgentKit names each LangChain tool
+# "<class>_<method>", e.g. "WalletActionProvider_get_balance".
+READ_ONLY_ACTIONS = (
+    ("WalletActionProvider", "get_balance"),
+    ("WalletActionProvider", "get_wallet_details"),
+    ("ERC20ActionProvider", "get_balance"),
+    ("CdpApiActionProvider", "address_reputation"),
+)
+READ_ONLY_TOOLS = frozenset(f"{cls}_{method}" for cls, method in READ_ONLY_ACTIONS)
+
+class _TurnCache:
+    """Read-only tool results of one agent turn {(tool name, arguments JSON): result}.
+    LangGraph may run a turn's tool calls in parallel threads, so every access takes the lock."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._results = {}
+        self._generation = 0  # Bumped by every clear, so reads that overlap a write are not stored
+
+    def call(self, key, func, *args, **kwargs):
+        with self._lock:
+            if key in self._results:
+                return self._results[key]
+            generation = self._generation
+        result = func(*args, **kwargs)
+        with self._lock:
+            if generation == self._generation:
+                self._results[key] = result
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._results.clear()
+            self._generation += 1
+
+# The cache of the turn running in this context; None outside a turn, where nothing is cached.
+# LangGraph copies the context into the threads that run tools, so they see their own turn's cache.
+_turn_cache = contextvars.ContextVar("wallet_turn_cache", default=None)
+
+@contextlib.contextmanager
+def tool_cache_turn(cache=None):
+    """Install a read-only tool cache for the agent turn run inside this block.
+
+    Pass the same cache to several blocks to share it across them, e.g. around each step of a
+    stream that is advanced from different contexts. The block must not contain a yield.
+    """
+    token = _turn_cache.set(cache if cache is not None else _TurnCache())
+    try:
+        yield
+    finally:
+        _turn_cache.reset(token)
+
+def stream_turn(agent_executor, inputs, config):
+    """Stream one agent turn, with its own read-only tool cache.
+
+    The cache is installed only while the stream is advanced, so callers may iterate this from a
+    different context on every step, such as a worker thread.
+    """
+    cache = _TurnCache()
+    stream = agent_executor.stream(inputs, config)
+    try:
+        while True:
+            with tool_cache_turn(cache):
+                chunk = next(stream, None)
+            if chunk is None:
+                return
+            yield chunk
+    finally:
+        stream.close()
+
+def _cache_read_only_tools(tools):
+    """Make read-only tools reuse their results within a turn; any other tool call clears them."""
+    for tool in tools:
+        func = tool.func
+        if tool.name in READ_ONLY_TOOLS:
+            def cached(*args, _func=func, _name=tool.name, **kwargs):
+                cache = _turn_cache.get()
+                if cache is None:
+                    return _func(*args, **kwargs)
+                key = (_name, json.dumps([args, kwargs], sort_keys=True, default=str))
+                return cache.call(key, _func, *args, **kwargs)
+            tool.func = cached
+        else:
+            # A transfer, trade or deployment can change anything a read returned
+            def invalidating(*args, _func=func, **kwargs):
+                cache = _turn_cache.get()
+                if cache is not None:
+                    cache.clear()
+                return _func(*args, **kwargs)
+            tool.func = invalidating
+    if not READ_ONLY_TOOLS.intersection(tool.name for tool in tools):
+        # Every call would clear the cache; AgentKit has probably changed how it names tools
+        warnings.warn(
+            "None of the wallet tools matched READ_ONLY_TOOLS, so no tool results are cached",
+            RuntimeWarning,
+        )
+    return tools
+
+def wallet_identity():
+    """Return "<network id>:<address>" for the wallet the agent acts for."""
+    wallet_provider = prepare_agentkit().wallet_provider
+    return f"{wallet_provider.get_network().network_id}:{wallet_provider.get_address()}"
+
+@functools.lru_cache(maxsize=1)
 def create_agent():
-    """Initialize the agent with tools from AgentKit."""
+    """Initialize the agent with tools from AgentKit. Built once per process; later calls share it."""
     # Get AgentKit instance
     agentkit = prepare_agentkit()
 
@@ -48,7 +160,7 @@ def create_agent():
     llm = ChatOpenAI(model="gpt-4o-mini")
 
     # Get Langchain tools
-    tools = get_langchain_tools(agentkit)
+    tools = _cache_read_only_tools(get_langchain_tools(agentkit))
     
     # Store buffered conversation history in memory
     memory = MemorySaver()
@@ -1,6 +1,10 @@
 import os
-import json
+import mmap
+import orjson
+import time
+import functools
 import secrets
+from decimal import Decimal
 from dotenv import load_dotenv
 
 from coinbase_agentkit import (
@@ -51,41 +55,107 @@ Join us in shaping AgentKit! Check out the contribution guide:
 # Configure a file to persist wallet data
 wallet_data_file = "wallet_data.txt"
 
+# What the agent can do, in the order the tools are listed
+ACTION_PROVIDER_FACTORIES = (
+    cdp_wallet_action_provider,
+    cdp_api_action_provider,
+    erc20_action_provider,
+    wallet_action_provider,
+    weth_action_provider,
+)
+
+# Seconds a fetched wallet balance is reused; about one Base block
+BALANCE_TTL = 12.0
+
+
+class CachingCdpWalletProvider(CdpWalletProvider):
+    """CdpWalletProvider that reuses the native balance for BALANCE_TTL seconds.
+
+    Agents often check the balance several times in one turn, and each check is a CDP API
+    round trip. Any action that spends from the wallet drops the cached balance.
+    """
+
+    def __init__(self, config: CdpWalletProviderConfig | None = None, balance_ttl: float = BALANCE_TTL):
+        super().__init__(config)
+        self._balance_ttl = balance_ttl
+        self._balance_cache: tuple[float, Decimal] | None = None
+
+    def get_balance(self) -> Decimal:
+        cached = self._balance_cache
+        if cached is not None and time.monotonic() - cached[0] < self._balance_ttl:
+            return cached[1]
+        balance = super().get_balance()
+        self._balance_cache = (time.monotonic(), balance)
+        return balance
+
+    def native_transfer(self, to, value):
+        self._balance_cache = None
+        return super().native_transfer(to, value)
+
+    def send_transaction(self, transaction):
+        self._balance_cache = None
+        return super().send_transaction(transaction)
+
+    def deploy_contract(self, *args, **kwargs):
+        self._balance_cache = None
+        return super().deploy_contract(*args, **kwargs)
+
+    def deploy_nft(self, *args, **kwargs):
+        self._balance_cache = None
+        return super().deploy_nft(*args, **kwargs)
+
+    def deploy_token(self, *args, **kwargs):
+        self._balance_cache = None
+        return super().deploy_token(*args, **kwargs)
+
+    def trade(self, *args, **kwargs):
+        self._balance_cache = None
+        return super().trade(*args, **kwargs)
+
+@functools.lru_cache(maxsize=1)
 def prepare_agentkit():
-    """Initialize CDP Agentkit and return tools."""
+    """Initialize CDP Agentkit and return tools. The instance is built once per process and shared."""
 
     
     # Initialize WalletProvider
     wallet_data = None
     if os.path.exists(wallet_data_file):
-        with open(wallet_data_file) as f:
-            wallet_data = f.read()
+        # Map the file instead of reading it through a buffer; an empty file cannot be mapped
+        with open(wallet_data_file, "rb") as f:
+            if os.fstat(f.fileno()).st_size:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    wallet_data = mm[:].decode()
+            else:
+                wallet_data = ""
 
     cdp_config = None
     if wallet_data is not None:
         cdp_config = CdpWalletProviderConfig(wallet_data=wallet_data)
 
-    wallet_provider = CdpWalletProvider(cdp_config)
-
-    
+    # Built one after another: the wallet provider and CdpApiActionProvider both call
+    # Cdp.configure(), which sets global SDK state the wallet import then uses
+    wallet_provider = CachingCdpWalletProvider(cdp_config)
+    action_providers = [factory() for factory in ACTION_PROVIDER_FACTORIES]
 
     # Initialize AgentKit
     agentkit = AgentKit(AgentKitConfig(
         wallet_provider=wallet_provider,
-        action_providers=[
-            cdp_wallet_action_provider(),
-            cdp_api_action_provider(),
-            erc20_action_provider(),
-            wallet_action_provider(),
-            weth_action_provider(),
-        ]
+        action_providers=action_providers,
     ))
 
     
-    # Save wallet to file for reuse
-    wallet_data_json = json.dumps(wallet_provider.export_wallet().to_dict())
-    with open(wallet_data_file, "w") as f:
-        f.write(wallet_data_json)
+    # Save wallet to file for reuse, unless the file already holds this wallet
+    wallet_dict = wallet_provider.export_wallet().to_dict()
+    try:
+        unchanged = wallet_data is not None and orjson.loads(wallet_data) == wallet_dict
+    except orjson.JSONDecodeError:
+        unchanged = False
+    if not unchanged:
+        # Write a temporary file and swap it in, so a crash never leaves a truncated wallet file
+        tmp_file = wallet_data_file + ".tmp"
+        with open(tmp_file, "wb") as f:
+            f.write(orjson.dumps(wallet_dict, option=orjson.OPT_SORT_KEYS))
+        os.replace(tmp_file, wallet_data_file)
     
 
     return agentkit
\ No newline at end of file
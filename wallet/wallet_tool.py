@@ -1,22 +1,112 @@
 # wallet/wallet_tool.py
 
-from wallet.create_agent import create_agent
+import os
+import re
+import threading
+from concurrent.futures import Future
+
+from diskcache import Cache
+from wallet.create_agent import create_agent, stream_turn, wallet_identity
 from langchain_core.messages import HumanMessage
 
-# Initialize your langgraph wallet agent once.
-agent_executor, config = create_agent()
+# The langgraph wallet agent is created once, on the first wallet command, and shared after that.
+# Creating it sets up the CDP wallet provider, so importing this module stays cheap.
+_agent = None
+_agent_lock = threading.Lock()
+
+def _get_agent():
+    """Return the shared (agent_executor, config) pair, creating it on first use."""
+    global _agent
+    if _agent is None:
+        with _agent_lock:
+            if _agent is None:
+                _agent = create_agent()
+    return _agent
+
+# Answers to read-only commands, kept on disk so they survive restarts. diskcache is thread- and
+# process-safe. Entries expire quickly because balances move with every block.
+# Keys hold the wallet's network and address, since every wallet on the machine shares the cache,
+# and that wallet's write generation, which every other command bumps so older answers stop matching.
+_RESPONSE_CACHE = Cache(os.path.expanduser("~/.cache/dharma_agents/wallet"))
+_RESPONSE_TTL = 60
+
+# A command is cached only if it asks for wallet information and mentions nothing that acts
+_READ_ONLY_RE = re.compile(r"\b(balance|network|wallet details|address|price)\b", re.IGNORECASE)
+_WRITE_RE = re.compile(
+    r"\b(send|transfer|swap|trade|deploy|mint|wrap|unwrap|approve|faucet|request|sign|buy|sell)\b",
+    re.IGNORECASE,
+)
+
+# Read-only commands currently running, so identical concurrent ones wait for the same run {key: Future}
+_inflight = {}
+_inflight_lock = threading.Lock()
 
 def wallet_agent_tool(input_text: str) -> str:
     """
     Uses the langgraph wallet agent to process wallet-related commands.
     For example: "Send 0.1 ETH to 0xABCDEF..."
+    Read-only commands, like balance or network questions, are answered from a short-lived disk cache.
+    """
+    if _is_read_only(input_text):
+        _get_agent()  # The wallet is set up with the agent
+        wallet = wallet_identity()
+        generation = _RESPONSE_CACHE.get(("generation", wallet), 0)
+        # Commands differing only in case or whitespace share an entry
+        key = (wallet, generation, " ".join(input_text.split()).lower())
+        cached = _RESPONSE_CACHE.get(key)
+        if cached is not None:
+            return cached
+        
+        with _inflight_lock:
+            future = _inflight.get(key)
+            leader = future is None
+            if leader:
+                future = _inflight[key] = Future()
+        if not leader:
+            return future.result()
+        
+        try:
+            output = _run_agent(input_text)
+            _RESPONSE_CACHE.set(key, output, expire=_RESPONSE_TTL)
+            future.set_result(output)
+            return output
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with _inflight_lock:
+                del _inflight[key]
+    return _run_agent(input_text)
+
+def _is_read_only(input_text: str) -> bool:
+    """Whether a command asks for wallet information and mentions nothing that acts."""
+    return bool(_READ_ONLY_RE.search(input_text)) and not _WRITE_RE.search(input_text)
+
+def _run_agent(input_text: str) -> str:
+    """Run one command through the wallet agent and return its collected output."""
+    return "".join(wallet_agent_tool_stream(input_text))
+
+def wallet_agent_tool_stream(input_text: str):
+    """
+    Uses the langgraph wallet agent to process a wallet command, yielding its output as it is produced.
+    Callers can act on the first messages before the run ends. Answers are not taken from the response
+    cache here, but commands that may act still invalidate it.
     """
+    agent_executor, config = _get_agent()
+    generation_key = None
+    if not _is_read_only(input_text):
+        # This command may move funds, so cached answers for the wallet must not outlive it. The
+        # generation is bumped again afterwards, in case a read was cached while this one ran.
+        generation_key = ("generation", wallet_identity())
+        _RESPONSE_CACHE.incr(generation_key)
     messages = [HumanMessage(content=input_text)]
-    output = ""
-    # Run the langgraph agent; collect output from its stream.
-    for chunk in agent_executor.stream({"messages": messages}, config):
-        if "agent" in chunk:
-            output += chunk["agent"]["messages"][0].content
-        elif "tools" in chunk:
-            output += chunk["tools"]["messages"][0].content
-    return output
+    try:
+        # Run the langgraph agent; pass on output from its stream.
+        for chunk in stream_turn(agent_executor, {"messages": messages}, config):
+            if "agent" in chunk:
+                yield chunk["agent"]["messages"][0].content
+            elif "tools" in chunk:
+                yield chunk["tools"]["messages"][0].content
+    finally:
+        if generation_key is not None:
+            _RESPONSE_CACHE.incr(generation_key)